@@ -3,6 +3,8 @@ Slack integration with Block Kit rendering.
 Sends approval requests to Slack with circuit breaker protection.
 """
 
+from functools import lru_cache
+
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from pybreaker import CircuitBreaker, CircuitBreakerError
@@ -13,6 +15,18 @@ from app.config.settings import settings
 
 logger = structlog.get_logger()
 
+# Field types that need a text input and therefore a modal
+TEXT_INPUT_TYPES = frozenset(["text", "textarea", "email", "url", "tel", "number", "password"])
+
+# Header text for approval result messages, keyed by decision
+RESULT_HEADER_TEXT = {"approve": "✅ Approved", "reject": "❌ Rejected"}
+
+
+@lru_cache(maxsize=1024)
+def _readable_field_key(key: str) -> str:
+    """Turn a field name into a label (field names repeat across approvals)"""
+    return key.replace("_", " ").title()
+
 # Circuit breaker for Slack API to prevent cascading failures
 # pybreaker parameters:
 # - fail_max: Number of failures before opening the circuit
@@ -374,8 +388,9 @@ class SlackAdapter:
 
     def has_text_input_fields(self, schema: ApprovalUISchema) -> bool:
         """Check if schema has fields that require text input (need modal)."""
-        text_input_types = ["text", "textarea", "email", "url", "tel", "number", "password"]
-        return any(field.type in text_input_types for field in schema.fields)
+        if schema._has_text_inputs is None:
+            schema._has_text_inputs = any(field.type in TEXT_INPUT_TYPES for field in schema.fields)
+        return schema._has_text_inputs
 
     def render_modal_view(
         self,
@@ -395,10 +410,9 @@ class SlackAdapter:
             Slack modal view JSON
         """
         blocks = []
-        text_input_types = ["text", "textarea", "email", "url", "tel", "number", "password"]
 
         for field in schema.fields:
-            if field.type in text_input_types:
+            if field.type in TEXT_INPUT_TYPES:
                 if field.type == "textarea":
                     element = {
                         "type": "plain_text_input",
@@ -449,21 +463,20 @@ class SlackAdapter:
         Returns:
             Slack blocks
         """
-        emoji = "✅" if decision == "approve" else "❌"
-        status_text = "Approved" if decision == "approve" else "Rejected"
-
         blocks = [
             {
                 "type": "header",
-                "text": {"type": "plain_text", "text": f"{emoji} {status_text}"},
+                "text": {"type": "plain_text", "text": RESULT_HEADER_TEXT.get(decision, RESULT_HEADER_TEXT["reject"])},
             },
         ]
 
-        # Preserve original context if schema provided
+        # Preserve original context if schema provided (formatted once per schema)
         if schema:
+            if schema._result_context_text is None:
+                schema._result_context_text = f"*{schema.title}*\n{schema.description}"
             blocks.append({
                 "type": "section",
-                "text": {"type": "mrkdwn", "text": f"*{schema.title}*\n{schema.description}"}
+                "text": {"type": "mrkdwn", "text": schema._result_context_text}
             })
 
         blocks.append({"type": "divider"})
@@ -479,7 +492,7 @@ class SlackAdapter:
                     value_str = str(value)
 
                 # Make key more readable
-                readable_key = key.replace("_", " ").title()
+                readable_key = _readable_field_key(key)
                 fields.append({"type": "mrkdwn", "text": f"*{readable_key}:*\n{value_str}"})
 
             if fields:
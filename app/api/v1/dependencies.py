@@ -5,7 +5,7 @@ from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import get_db, Database
-from app.core import EventBus, TimeoutManager
+from app.core import EventBus, TimeoutManager, WorkflowEngine, ApprovalService
 from app.adapters import SlackAdapter
 
 # For Python 3.8 compatibility - not using Annotated
@@ -29,6 +29,22 @@ def get_database(request: Request) -> Database:
     return request.app.state.db
 
 
+def get_workflow_engine(
+    db_session: AsyncSession = Depends(get_db),
+    event_bus: EventBus = Depends(get_event_bus),
+) -> WorkflowEngine:
+    """Get workflow engine bound to the request's database session."""
+    return WorkflowEngine(db_session, event_bus)
+
+
+def get_approval_service(
+    db_session: AsyncSession = Depends(get_db),
+    event_bus: EventBus = Depends(get_event_bus),
+) -> ApprovalService:
+    """Get approval service bound to the request's database session."""
+    return ApprovalService(db_session, event_bus)
+
+
 def get_orchestrator(db_session: AsyncSession, event_bus: EventBus):
     """
     Get agent orchestrator with registered agents.
@@ -74,4 +90,6 @@ DbSession = AsyncSession
 EventBusDep = EventBus
 TimeoutManagerDep = TimeoutManager
 SlackAdapterDep = SlackAdapter
+WorkflowEngineDep = WorkflowEngine
+ApprovalServiceDep = ApprovalService
 DatabaseDep = Database
\ No newline at end of file
@@ -1,5 +1,6 @@
 """Admin and Dead Letter Queue management endpoints."""
 
+import asyncio
 import json
 from datetime import datetime
 import structlog
@@ -7,6 +8,7 @@ from fastapi import APIRouter, HTTPException, Request, Depends
 from sqlalchemy import select
 
 from app.api.v1.dependencies import get_event_bus
+from app.config.settings import settings
 from app.models import DeadLetterQueue, get_db
 from app.models.schemas import EventType
 
@@ -153,50 +155,94 @@ async def retry_all_dlq_entries(
     Use this after deploying a bug fix that should resolve all failures.
     WARNING: This will republish ALL failed events. Use with caution.
     """
-    # Get all DLQ entries
-    result = await db_session.execute(
-        select(DeadLetterQueue).order_by(DeadLetterQueue.created_at.asc())
+    # Stream DLQ entries in chunks instead of loading the whole table, so
+    # memory stays flat and publishing starts with the first chunk
+    result = await db_session.stream(
+        select(DeadLetterQueue)
+        .order_by(DeadLetterQueue.created_at.asc())
+        .execution_options(yield_per=settings.dlq_stream_batch_size)
     )
-    entries = result.scalars().all()
-
-    if not entries:
-        return {
-            "success": True,
-            "message": "No DLQ entries to retry",
-            "retried_count": 0
-        }
 
+    total_count = 0
     retried_count = 0
     failed_count = 0
     errors = []
 
-    for entry in entries:
-        try:
-            # Parse event data
-            event_data = json.loads(entry.event_data)
-            event_type = EventType(entry.original_event_type)
+    # Fixed-size worker pool draining a bounded queue: constant memory and
+    # bounded concurrency against the event bus, while still overlapping I/O
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.dlq_retry_queue_size)
+
+    async def republish_worker():
+        nonlocal retried_count, failed_count
+
+        while True:
+            entry = await queue.get()
+            try:
+                # Parse event data
+                event_data = json.loads(entry.event_data)
+                event_type = EventType(entry.original_event_type)
+
+                # Republish event - give up on this entry if the bus stays
+                # full, so one stall does not hold up the whole retry
+                await asyncio.wait_for(
+                    event_bus.publish(event_type, event_data),
+                    timeout=settings.dlq_retry_publish_timeout_seconds,
+                )
+                retried_count += 1
+
+                logger.info(
+                    "dlq_entry_republished_bulk",
+                    dlq_id=entry.id,
+                    event_type=entry.original_event_type
+                )
+
+            except asyncio.TimeoutError:
+                failed_count += 1
+                errors.append({
+                    "entry_id": entry.id,
+                    "error": "publish timeout"
+                })
+                logger.warning(
+                    "dlq_bulk_retry_publish_timeout",
+                    dlq_id=entry.id,
+                    timeout_seconds=settings.dlq_retry_publish_timeout_seconds
+                )
+            except Exception as e:
+                failed_count += 1
+                errors.append({
+                    "entry_id": entry.id,
+                    "error": str(e)
+                })
+                logger.error(
+                    "dlq_bulk_retry_failed",
+                    dlq_id=entry.id,
+                    error=str(e)
+                )
+            finally:
+                queue.task_done()
+
+    workers = [
+        asyncio.create_task(republish_worker())
+        for _ in range(settings.dlq_retry_workers)
+    ]
 
-            # Republish event
-            await event_bus.publish(event_type, event_data)
-            retried_count += 1
+    try:
+        async for entry in result.scalars():
+            total_count += 1
+            await queue.put(entry)
 
-            logger.info(
-                "dlq_entry_republished_bulk",
-                dlq_id=entry.id,
-                event_type=entry.original_event_type
-            )
+        await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
-        except Exception as e:
-            failed_count += 1
-            errors.append({
-                "entry_id": entry.id,
-                "error": str(e)
-            })
-            logger.error(
-                "dlq_bulk_retry_failed",
-                dlq_id=entry.id,
-                error=str(e)
-            )
+    if not total_count:
+        return {
+            "success": True,
+            "message": "No DLQ entries to retry",
+            "retried_count": 0
+        }
 
     return {
         "success": True,
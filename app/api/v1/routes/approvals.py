@@ -1,10 +1,12 @@
 """Approval management API endpoints."""
 
+from typing import List
+
 import structlog
 from fastapi import APIRouter, HTTPException, Depends
+from pydantic import TypeAdapter
 
-from app.api.v1.dependencies import get_event_bus
-from app.models import get_db
+from app.api.v1.dependencies import get_approval_service
 from app.core import ApprovalService
 from app.config import verify_callback_token
 from app.models.schemas import (
@@ -16,18 +18,18 @@ from app.models.schemas import (
 router = APIRouter(tags=["approvals"])
 logger = structlog.get_logger()
 
+# Built once: validates a whole page of approvals in a single pydantic-core call
+_APPROVAL_LIST_ADAPTER = TypeAdapter(List[ApprovalRequestResponse])
+
 
 @router.post("/api/workflows/{workflow_id}/request-approval", response_model=ApprovalRequestResponse)
 async def request_approval_for_workflow(
     workflow_id: str,
     approval_schema: ApprovalUISchema,
     timeout_seconds: int = 3600,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """Manually request approval for a workflow"""
-    approval_service = ApprovalService(db_session, event_bus)
-
     approval = await approval_service.request_approval(workflow_id, approval_schema, timeout_seconds)
 
     # Get approval dict and remove ui_schema to avoid duplicate argument
@@ -44,12 +46,9 @@ async def request_approval_for_workflow(
 @router.get("/api/approvals/{approval_id}", response_model=ApprovalRequestResponse)
 async def get_approval(
     approval_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """Get approval request details"""
-    approval_service = ApprovalService(db_session, event_bus)
-
     try:
         approval = await approval_service.get_approval(approval_id)
 
@@ -68,35 +67,27 @@ async def get_approval(
 
 @router.get("/api/approvals")
 async def get_pending_approvals(
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """Get all pending approval requests"""
-    approval_service = ApprovalService(db_session, event_bus)
-
     approvals = await approval_service.get_pending_approvals()
 
-    # Convert to response format
-    approval_list = []
-    for approval in approvals:
-        approval_dict = approval.to_dict()
-        approval_dict.pop('ui_schema', None)
-
-        approval_list.append(ApprovalRequestResponse(
-            **approval_dict,
-            is_expired=approval.is_expired(),
-            ui_schema=ApprovalUISchema(**approval.ui_schema_dict),
-        ))
-
-    return approval_list
+    # Convert to response format - plain dicts, validated (ui_schema included) in one pass
+    return _APPROVAL_LIST_ADAPTER.validate_python([
+        {
+            **approval.to_dict(),
+            "is_expired": approval.is_expired(),
+            "ui_schema": approval.ui_schema_dict,
+        }
+        for approval in approvals
+    ])
 
 
 @router.post("/api/callbacks/{callback_token}")
 async def approval_callback(
     callback_token: str,
     response: ApprovalResponseSubmit,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """
     Callback endpoint for approval responses.
@@ -107,8 +98,6 @@ async def approval_callback(
     if not approval_id:
         raise HTTPException(status_code=403, detail="Invalid callback token")
 
-    approval_service = ApprovalService(db_session, event_bus)
-
     try:
         approval = await approval_service.respond_to_approval(
             approval_id,
@@ -124,15 +113,12 @@ async def approval_callback(
 @router.post("/api/approvals/{approval_id}/rollback")
 async def rollback_approval(
     approval_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """
     Rollback a rejected approval to pending state.
     Allows users to correct mistaken rejections.
     """
-    approval_service = ApprovalService(db_session, event_bus)
-
     try:
         approval = await approval_service.rollback_approval(approval_id)
         return {"success": True, "approval_id": approval_id, "status": approval.status}
@@ -15,7 +15,6 @@ from app.models.schemas import (
     ChatMessageRequest,
     ChatMessageResponse,
     ConversationHistoryResponse,
-    ConversationMessage,
 )
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
@@ -113,31 +112,23 @@ async def get_conversation(
                 detail=f"Conversation {conversation_id} not found"
             )
 
-        # Convert to response format
-        messages = [
-            ConversationMessage(
-                role=msg["role"],
-                content=msg["content"],
-                timestamp=msg["timestamp"]
-            )
-            for msg in conversation.messages_list
-        ]
-
-        return ConversationHistoryResponse(
-            id=conversation.id,
-            conversation_id=conversation.conversation_id,
-            user_id=conversation.user_id,
-            channel=conversation.channel,
-            messages=messages,
-            state=conversation.state,
-            current_agent=conversation.current_agent,
-            workflow_id=conversation.workflow_id,
-            approval_id=conversation.approval_id,
-            metadata=conversation.metadata_dict,
-            created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            last_message_at=conversation.last_message_at
-        )
+        # Convert to response format - the raw message dicts are validated
+        # by pydantic-core together with the rest of the model
+        return ConversationHistoryResponse.model_validate({
+            "id": conversation.id,
+            "conversation_id": conversation.conversation_id,
+            "user_id": conversation.user_id,
+            "channel": conversation.channel,
+            "messages": conversation.messages_list,
+            "state": conversation.state,
+            "current_agent": conversation.current_agent,
+            "workflow_id": conversation.workflow_id,
+            "approval_id": conversation.approval_id,
+            "metadata": conversation.metadata_dict,
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at,
+            "last_message_at": conversation.last_message_at,
+        })
 
     except HTTPException:
         raise
@@ -170,35 +161,30 @@ async def delete_conversation(
     - Testing and cleanup
     """
     try:
-        from sqlalchemy import select, delete
+        from sqlalchemy import delete
         from app.models.orm import ConversationHistory
 
-        # Check if conversation exists
+        # Delete conversation in a single round-trip - RETURNING tells us
+        # whether it existed without a separate SELECT
         result = await db_session.execute(
-            select(ConversationHistory).where(
-                ConversationHistory.conversation_id == conversation_id
-            )
+            delete(ConversationHistory)
+            .where(ConversationHistory.conversation_id == conversation_id)
+            .returning(ConversationHistory.user_id)
         )
-        conversation = result.scalar_one_or_none()
+        row = result.first()
 
-        if not conversation:
+        if row is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Conversation {conversation_id} not found"
             )
 
-        # Delete conversation
-        await db_session.execute(
-            delete(ConversationHistory).where(
-                ConversationHistory.conversation_id == conversation_id
-            )
-        )
         await db_session.commit()
 
         logger.info(
             "conversation_deleted",
             conversation_id=conversation_id,
-            user_id=conversation.user_id
+            user_id=row.user_id
         )
 
         return {
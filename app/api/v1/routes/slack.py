@@ -1,11 +1,17 @@
 """Slack integration API endpoints."""
 
-import json
+import time
+from typing import Any, Dict
+from urllib.parse import parse_qs
 import structlog
-from fastapi import APIRouter, HTTPException, Request, Depends
-
-from app.api.v1.dependencies import get_event_bus, get_slack_adapter
-from app.models import get_db
+from fastapi import APIRouter, HTTPException, Request, Depends, BackgroundTasks
+from sqlalchemy import select
+
+from app.api.v1.dependencies import get_approval_service, get_slack_adapter
+from app.config.settings import settings
+from app.models import get_db, ApprovalRequest
+from app.models.orm import ConversationHistory
+from app.models.serialization import json_loads
 from app.core import ApprovalService
 from app.config import verify_callback_token, verify_slack_signature
 
@@ -16,19 +22,37 @@ logger = structlog.get_logger()
 @router.post("/interactive")
 async def handle_slack_interaction(
     request: Request,
+    background_tasks: BackgroundTasks,
     db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
     slack_adapter = Depends(get_slack_adapter),
 ):
     """
     Handle Slack interactive component callbacks (button clicks and modal submissions).
     Slack sends form-encoded payload with signature verification.
     """
-    # Get raw body and headers for signature verification
-    body = await request.body()
     timestamp = request.headers.get("X-Slack-Request-Timestamp", "")
     signature = request.headers.get("X-Slack-Signature", "")
 
+    # Cheap header checks first - stale/replayed or oversized requests are
+    # rejected before the body is buffered
+    try:
+        request_age = abs(time.time() - int(timestamp))
+    except ValueError:
+        request_age = None
+
+    if request_age is None or request_age > settings.slack_request_max_age_seconds:
+        logger.warning("slack_request_timestamp_rejected", timestamp=timestamp)
+        raise HTTPException(status_code=403, detail="Invalid Slack signature")
+
+    content_length = request.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.slack_max_body_bytes:
+        logger.warning("slack_request_too_large", content_length=int(content_length))
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    # Get raw body for signature verification
+    body = await request.body()
+
     logger.info(
         "slack_interaction_received",
         timestamp=timestamp,
@@ -41,29 +65,33 @@ async def handle_slack_interaction(
         logger.warning("slack_signature_verification_failed")
         raise HTTPException(status_code=403, detail="Invalid Slack signature")
 
-    # Parse form data
-    form_data = await request.form()
-    payload_str = form_data.get("payload")
+    # Parse the urlencoded body we already hold - Slack sends a single
+    # "payload" field, so Starlette's full form parser is unnecessary
+    try:
+        form_data = parse_qs(body.decode("utf-8"), max_num_fields=4)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed form body")
+    payload_str = form_data.get("payload", [None])[0]
 
     if not payload_str:
         raise HTTPException(status_code=400, detail="No payload")
 
-    payload = json.loads(payload_str)
+    payload = json_loads(payload_str)
     payload_type = payload.get("type")
 
     logger.info("slack_payload_type", type=payload_type)
 
     # Route based on payload type
     if payload_type == "block_actions":
-        return await handle_button_click(payload, db_session, event_bus, slack_adapter)
+        return await handle_button_click(payload, db_session, approval_service, slack_adapter)
     elif payload_type == "view_submission":
-        return await handle_modal_submission(payload, db_session, event_bus, slack_adapter)
+        return await handle_modal_submission(payload, db_session, approval_service, slack_adapter, background_tasks)
     else:
         logger.warning("unknown_payload_type", type=payload_type)
         raise HTTPException(status_code=400, detail=f"Unknown payload type: {payload_type}")
 
 
-async def handle_button_click(payload: dict, db_session, event_bus, slack_adapter):
+async def handle_button_click(payload: dict, db_session, approval_service: ApprovalService, slack_adapter):
     """Handle button click - either open modal or process immediately."""
     action = payload["actions"][0]
     callback_token = action["value"]  # format: "approval_id:random:signature"
@@ -78,15 +106,13 @@ async def handle_button_click(payload: dict, db_session, event_bus, slack_adapte
         return {"text": "❌ Invalid or expired approval link"}
 
     # Get approval to check schema
-    approval_service = ApprovalService(db_session, event_bus)
     approval = await approval_service.get_approval(approval_id)
 
     if not approval:
         return {"text": "❌ Approval not found"}
 
-    # Parse schema
-    from app.models.schemas import ApprovalUISchema
-    schema = ApprovalUISchema(**approval.ui_schema_dict)
+    # Parse schema (cached per approval)
+    schema = approval_service.get_ui_schema(approval)
 
     # Determine decision
     decision = "approve" if "approve" in action_id else "reject"
@@ -141,33 +167,23 @@ async def handle_button_click(payload: dict, db_session, event_bus, slack_adapte
         logger.error("approval_processing_error", error=str(e))
 
         # Send error message to conversation
-        try:
-            from app.models.orm import ConversationHistory
-            from sqlalchemy import select
-
-            approval = await approval_service.get_approval(approval_id)
-            if approval and approval.workflow_id:
-                stmt = select(ConversationHistory).where(
-                    ConversationHistory.workflow_id == approval.workflow_id
-                )
-                result = await db_session.execute(stmt)
-                conversation = result.scalar_one_or_none()
-
-                if conversation:
-                    error_message = (
-                        f"⚠️ **Approval failed**\n\n"
-                        f"Error: {str(e)}\n\n"
-                        f"Please try again."
-                    )
-                    conversation.add_message("assistant", error_message)
-                    await db_session.commit()
-        except Exception as conv_error:
-            logger.error("failed_to_send_error_to_conversation", error=str(conv_error), exc_info=True)
+        error_message = (
+            f"⚠️ **Approval failed**\n\n"
+            f"Error: {str(e)}\n\n"
+            f"Please try again."
+        )
+        await send_error_to_conversation(db_session, approval_id, error_message)
 
         return {"text": f"❌ Error: {str(e)}"}
 
 
-async def handle_modal_submission(payload: dict, db_session, event_bus, slack_adapter):
+async def handle_modal_submission(
+    payload: dict,
+    db_session,
+    approval_service: ApprovalService,
+    slack_adapter,
+    background_tasks: BackgroundTasks,
+):
     """Handle modal submission - process approval with modal values."""
     # Parse callback_id: "token:decision"
     # Token format: "approval_id:random:signature"
@@ -199,26 +215,27 @@ async def handle_modal_submission(payload: dict, db_session, event_bus, slack_ad
     logger.info("modal_data_extracted", response_data=response_data)
 
     # Process approval
-    approval_service = ApprovalService(db_session, event_bus)
-
     try:
-        await approval_service.respond_to_approval(approval_id, decision, response_data)
+        # respond_to_approval returns the row it just updated - no need to re-fetch it
+        approval = await approval_service.respond_to_approval(approval_id, decision, response_data)
 
         logger.info("approval_processed_from_modal", approval_id=approval_id)
 
         # Modal auto-closes on success
         # Update the original message with context preserved
-        approval = await approval_service.get_approval(approval_id)
-        if approval and approval.slack_message_ts:
+        if approval.slack_message_ts:
             # Parse schema to preserve context
-            from app.models.schemas import ApprovalUISchema
-            schema = ApprovalUISchema(**approval.ui_schema_dict)
+            schema = approval_service.get_ui_schema(approval)
 
-            result_blocks = slack_adapter.render_approval_result(decision, response_data, schema)
-            await slack_adapter.update_message(
+            # Slack gives view submissions a 3s deadline - render and update the
+            # message after the response is sent so the modal closes immediately
+            background_tasks.add_task(
+                update_approval_result_message,
+                slack_adapter,
                 approval.slack_message_ts,
-                f"✅ {'Approved' if decision == 'approve' else 'Rejected'}",
-                result_blocks
+                decision,
+                response_data,
+                schema,
             )
 
         return {"response_action": "clear"}  # Close modal
@@ -227,31 +244,12 @@ async def handle_modal_submission(payload: dict, db_session, event_bus, slack_ad
         logger.error("modal_approval_error", error=str(e))
 
         # Send error message to conversation (so user knows what happened)
-        try:
-            from app.models.orm import ConversationHistory
-            from sqlalchemy import select
-
-            # Get approval to find linked workflow
-            approval = await approval_service.get_approval(approval_id)
-            if approval and approval.workflow_id:
-                # Find conversation linked to this workflow
-                stmt = select(ConversationHistory).where(
-                    ConversationHistory.workflow_id == approval.workflow_id
-                )
-                result = await db_session.execute(stmt)
-                conversation = result.scalar_one_or_none()
-
-                if conversation:
-                    error_message = (
-                        f"⚠️ **Approval validation failed**\n\n"
-                        f"Error: {str(e)}\n\n"
-                        f"Please try again and fill in all required fields."
-                    )
-                    conversation.add_message("assistant", error_message)
-                    await db_session.commit()
-                    logger.info("error_message_sent_to_conversation", conversation_id=conversation.conversation_id)
-        except Exception as conv_error:
-            logger.error("failed_to_send_error_to_conversation", error=str(conv_error), exc_info=True)
+        error_message = (
+            f"⚠️ **Approval validation failed**\n\n"
+            f"Error: {str(e)}\n\n"
+            f"Please try again and fill in all required fields."
+        )
+        await send_error_to_conversation(db_session, approval_id, error_message)
 
         # Show error in modal
         return {
@@ -260,26 +258,77 @@ async def handle_modal_submission(payload: dict, db_session, event_bus, slack_ad
         }
 
 
-def extract_field_values(state_values: dict) -> dict:
+async def update_approval_result_message(
+    slack_adapter,
+    message_ts: str,
+    decision: str,
+    response_data: dict,
+    schema,
+):
+    """Replace the original approval message with the decision (runs after the response)."""
+    result_blocks = slack_adapter.render_approval_result(decision, response_data, schema)
+    await slack_adapter.update_message(
+        message_ts,
+        f"✅ {'Approved' if decision == 'approve' else 'Rejected'}",
+        result_blocks
+    )
+
+
+async def send_error_to_conversation(db_session, approval_id: str, error_message: str):
+    """
+    Post an approval error into the conversation linked to the approval's workflow.
+
+    Resolves approval -> workflow -> conversation with a single JOIN query
+    instead of re-fetching the approval and then the conversation.
+    """
+    try:
+        stmt = (
+            select(ConversationHistory)
+            .join(ApprovalRequest, ApprovalRequest.workflow_id == ConversationHistory.workflow_id)
+            .where(ApprovalRequest.id == approval_id)
+        )
+        result = await db_session.execute(stmt)
+        conversation = result.scalar_one_or_none()
+
+        if conversation:
+            conversation.add_message("assistant", error_message)
+            await db_session.commit()
+            logger.info("error_message_sent_to_conversation", conversation_id=conversation.conversation_id)
+    except Exception as conv_error:
+        # Already on an error path - only pay for traceback formatting when debugging
+        logger.error(
+            "failed_to_send_error_to_conversation",
+            error=repr(conv_error),
+            exc_info=settings.debug,
+        )
+
+
+# Slack element state key -> value extractor.
+# Each element state carries exactly one of these keys (next to "type"),
+# so a single pass over its keys finds the value with one hash probe per key.
+_FIELD_VALUE_EXTRACTORS = {
+    "selected_option": lambda v: v["selected_option"].get("value"),
+    "selected_options": lambda v: [opt.get("value") for opt in v["selected_options"]],
+    "value": lambda v: v["value"],
+    "selected_date": lambda v: v["selected_date"],
+    "selected_time": lambda v: v["selected_time"],
+    "selected_date_time": lambda v: v["selected_date_time"],
+}
+
+
+def extract_field_values(state_values: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
     """Extract field values from Slack state (works for both messages and modals)."""
-    response_data = {}
+    response_data: Dict[str, Any] = {}
 
-    for block_id, block_state in state_values.items():
+    for block_state in state_values.values():
         for field_action_id, value in block_state.items():
             if field_action_id.startswith("field_"):
                 field_name = field_action_id.replace("field_", "")
                 # Handle different input types
-                if "selected_option" in value and value["selected_option"]:
-                    response_data[field_name] = value["selected_option"].get("value")
-                elif "selected_options" in value and value["selected_options"]:
-                    response_data[field_name] = [opt.get("value") for opt in value["selected_options"]]
-                elif "value" in value and value["value"]:
-                    response_data[field_name] = value["value"]
-                elif "selected_date" in value and value["selected_date"]:
-                    response_data[field_name] = value["selected_date"]
-                elif "selected_time" in value and value["selected_time"]:
-                    response_data[field_name] = value["selected_time"]
-                elif "selected_date_time" in value and value["selected_date_time"]:
-                    response_data[field_name] = value["selected_date_time"]
-
-    return response_data
\ No newline at end of file
+                for key, raw in value.items():
+                    extractor = _FIELD_VALUE_EXTRACTORS.get(key)
+                    if extractor is not None and raw:
+                        response_data[field_name] = extractor(value)
+                        break
+
+    return response_data
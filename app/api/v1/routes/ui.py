@@ -4,9 +4,9 @@ import structlog
 from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
-from app.api.v1.dependencies import get_event_bus
-from app.models import get_db
+from app.api.v1.dependencies import get_approval_service
 from app.core import ApprovalService
 from app.config.settings import settings
 
@@ -20,7 +20,9 @@ templates = Jinja2Templates(directory="static")
 @router.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Landing page with API documentation links"""
-    return templates.TemplateResponse(
+    # Render in the threadpool so template rendering never blocks the event loop
+    return await run_in_threadpool(
+        templates.TemplateResponse,
         "index.html",
         {
             "request": request,
@@ -34,16 +36,15 @@ async def root(request: Request):
 async def approval_page(
     approval_id: str,
     request: Request,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    approval_service: ApprovalService = Depends(get_approval_service),
 ):
     """Render HTML form for approval"""
-    approval_service = ApprovalService(db_session, event_bus)
-
     try:
         approval = await approval_service.get_approval(approval_id)
 
-        return templates.TemplateResponse(
+        # Render off the event loop (see root)
+        return await run_in_threadpool(
+            templates.TemplateResponse,
             "approval_form.html",
             {
                 "request": request,
@@ -1,23 +1,24 @@
 """Workflow management API endpoints."""
 
 from typing import List
-from datetime import datetime, timedelta
-import json
+import time
 import structlog
 from fastapi import APIRouter, HTTPException, Header, Depends
 from fastapi.responses import JSONResponse
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload
 
-from app.api.v1.dependencies import get_event_bus
+from app.api.v1.dependencies import get_workflow_engine
+from app.config.settings import settings
 from app.models import get_db
-from app.core import WorkflowEngine, ApprovalService, InvalidStateTransitionError
+from app.core import WorkflowEngine, InvalidStateTransitionError
 from app.models import IdempotencyKey
+from app.models.serialization import json_loads, json_dumps
 from app.models.schemas import (
     WorkflowCreate,
     WorkflowResponse,
     WorkflowEventsResponse,
-    WorkflowEventResponse,
     WorkflowState,
     ApprovalUISchema,
     WorkflowStepResponse,
@@ -26,13 +27,18 @@ from app.models.schemas import (
 router = APIRouter(prefix="/api/workflows", tags=["workflows"])
 logger = structlog.get_logger()
 
+# Stored while the request that claimed an idempotency key is still running
+IDEMPOTENCY_IN_PROGRESS_BODY = json_dumps({
+    "detail": "A request with this Idempotency-Key is still being processed"
+})
+
 
 @router.post("", response_model=WorkflowResponse)
 async def create_workflow(
     workflow_req: WorkflowCreate,
     idempotency_key: str = Header(None, alias="Idempotency-Key"),
     db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Create a new workflow with optional approval requirement.
@@ -42,15 +48,49 @@ async def create_workflow(
 
     Supports idempotency via Idempotency-Key header to prevent duplicate workflows.
     """
-    # Check for idempotency key
+    # Atomically claim the idempotency key before doing any work.
+    # INSERT ... ON CONFLICT replaces the SELECT-then-INSERT pair and closes the
+    # race between concurrent duplicate submissions: the loser sees the
+    # in-progress placeholder (409) instead of creating a second workflow.
     if idempotency_key:
-        # Check if key already exists
-        result = await db_session.execute(
-            select(IdempotencyKey).where(IdempotencyKey.key == idempotency_key)
+        now = time.time()
+        claim_stmt = sqlite_insert(IdempotencyKey).values(
+            key=idempotency_key,
+            workflow_id=None,
+            response_code=409,
+            response_body=IDEMPOTENCY_IN_PROGRESS_BODY,
+            created_at=now,
+            expires_at=now + settings.idempotency_key_expiry_hours * 3600,
         )
-        existing = result.scalar_one_or_none()
+        claim_stmt = claim_stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                "workflow_id": None,
+                "response_code": claim_stmt.excluded.response_code,
+                "response_body": claim_stmt.excluded.response_body,
+                "created_at": claim_stmt.excluded.created_at,
+                "expires_at": claim_stmt.excluded.expires_at,
+            },
+            # Only reclaim keys that have expired
+            where=IdempotencyKey.expires_at <= now,
+        ).returning(IdempotencyKey.key)
+
+        claim = await db_session.execute(claim_stmt)
+
+        if claim.first() is None:
+            result = await db_session.execute(
+                select(IdempotencyKey).where(IdempotencyKey.key == idempotency_key)
+            )
+            existing = result.scalar_one_or_none()
+
+            if existing is None:
+                # The claimant failed and released the key between our INSERT
+                # and this read - the client may retry right away
+                return JSONResponse(
+                    status_code=409,
+                    content=json_loads(IDEMPOTENCY_IN_PROGRESS_BODY),
+                )
 
-        if existing and not existing.is_expired():
             logger.info(
                 "idempotency_key_found",
                 idempotency_key=idempotency_key,
@@ -58,61 +98,84 @@ async def create_workflow(
             )
             return JSONResponse(
                 status_code=existing.response_code,
-                content=existing.response_body if isinstance(existing.response_body, dict) else json.loads(existing.response_body)
+                content=json_loads(existing.response_body)
             )
 
-    engine = WorkflowEngine(db_session, event_bus)
-    approval_service = ApprovalService(db_session, event_bus)
-
     # Prepare context with approval schema embedded (if provided)
     context = workflow_req.context.copy()
     if workflow_req.approval_schema:
         context["_approval_schema"] = workflow_req.approval_schema.model_dump()
         context["_approval_timeout"] = workflow_req.approval_timeout_seconds
 
-    # Create workflow (commits internally, then publishes workflow.started event)
-    workflow = await engine.create_workflow(
-        workflow_req.workflow_type,
-        context,
-        steps=[step.model_dump() for step in workflow_req.steps] if workflow_req.steps else None,
-        approval_timeout_seconds=workflow_req.approval_timeout_seconds,
-    )
+    # Create workflow (commits internally - together with the idempotency claim,
+    # which it binds to the workflow - then publishes workflow.started event)
+    try:
+        workflow = await engine.create_workflow(
+            workflow_req.workflow_type,
+            context,
+            steps=[step.model_dump() for step in workflow_req.steps] if workflow_req.steps else None,
+            approval_timeout_seconds=workflow_req.approval_timeout_seconds,
+            idempotency_key=idempotency_key,
+        )
+    except Exception:
+        if idempotency_key:
+            await db_session.rollback()
+            result = await db_session.execute(
+                select(IdempotencyKey.workflow_id).where(IdempotencyKey.key == idempotency_key)
+            )
+            created_workflow_id = result.scalar_one_or_none()
+            if created_workflow_id is None:
+                # Nothing was committed - release the claim so the client can retry
+                await db_session.execute(
+                    delete(IdempotencyKey).where(
+                        IdempotencyKey.key == idempotency_key,
+                        IdempotencyKey.workflow_id.is_(None),
+                    )
+                )
+                await db_session.commit()
+            else:
+                # The workflow was committed before the failure - keep the key and
+                # answer retries with that workflow instead of creating another
+                await _store_idempotent_response(
+                    db_session, idempotency_key, await engine.get_workflow(created_workflow_id)
+                )
+        raise
 
     logger.info("workflow_created_via_api", workflow_id=workflow.id)
 
-    # Store idempotency key if provided
+    # Fill in the claimed idempotency key with the real response
     if idempotency_key:
-        response_body = workflow.to_dict()
-        idem_record = IdempotencyKey(
-            key=idempotency_key,
-            workflow_id=workflow.id,
-            response_code=200,
-            response_body=json.dumps(response_body),
-            created_at=datetime.now().timestamp(),
-            expires_at=(datetime.now() + timedelta(hours=24)).timestamp()
-        )
-        db_session.add(idem_record)
-        await db_session.commit()
+        await _store_idempotent_response(db_session, idempotency_key, workflow)
 
-        logger.info(
-            "idempotency_key_stored",
-            idempotency_key=idempotency_key,
+    return WorkflowResponse(**workflow.to_dict())
+
+
+async def _store_idempotent_response(db_session, idempotency_key: str, workflow) -> None:
+    """Replace the in-progress placeholder of a claimed key with the workflow response"""
+    await db_session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == idempotency_key)
+        .values(
             workflow_id=workflow.id,
-            expires_at=idem_record.expires_at
+            response_code=200,
+            response_body=json_dumps(workflow.to_dict()),
         )
+    )
+    await db_session.commit()
 
-    return WorkflowResponse(**workflow.to_dict())
+    logger.info(
+        "idempotency_key_stored",
+        idempotency_key=idempotency_key,
+        workflow_id=workflow.id
+    )
 
 
 @router.get("/{workflow_id}", response_model=WorkflowResponse)
 async def get_workflow(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """Get workflow by ID"""
-    engine = WorkflowEngine(db_session, event_bus)
-
     try:
         workflow = await engine.get_workflow(workflow_id)
         return WorkflowResponse(**workflow.to_dict())
@@ -123,18 +186,16 @@ async def get_workflow(
 @router.get("/{workflow_id}/events", response_model=WorkflowEventsResponse)
 async def get_workflow_events(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """Get all events for a workflow (audit trail)"""
-    engine = WorkflowEngine(db_session, event_bus)
-
     try:
         events = await engine.get_workflow_events(workflow_id)
-        return WorkflowEventsResponse(
-            workflow_id=workflow_id,
-            events=[WorkflowEventResponse(**event.to_dict()) for event in events],
-        )
+        # Plain dicts - response_model validates and serializes them in one pass
+        return {
+            "workflow_id": workflow_id,
+            "events": [event.to_dict() for event in events],
+        }
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -143,27 +204,23 @@ async def get_workflow_events(
 async def list_workflows(
     state: WorkflowState = None,
     limit: int = 100,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """List workflows, optionally filtered by state"""
-    engine = WorkflowEngine(db_session, event_bus)
     workflows = await engine.list_workflows(state, limit)
-    return [WorkflowResponse(**wf.to_dict()) for wf in workflows]
+    # Plain dicts - response_model validates them and drops the rollback bookkeeping fields
+    return [wf.to_dict() for wf in workflows]
 
 
 @router.post("/{workflow_id}/cancel", response_model=WorkflowResponse)
 async def cancel_workflow(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Cancel a running workflow.
     Transitions workflow to FAILED state with cancellation reason.
     """
-    engine = WorkflowEngine(db_session, event_bus)
-
     try:
         workflow = await engine.mark_failed(workflow_id, "Cancelled by user")
         logger.info("workflow_cancelled", workflow_id=workflow_id)
@@ -175,8 +232,7 @@ async def cancel_workflow(
 @router.post("/{workflow_id}/retry", response_model=WorkflowResponse)
 async def retry_workflow(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Retry a failed or timed-out workflow.
@@ -185,8 +241,6 @@ async def retry_workflow(
     REJECTED workflows cannot be retried (user decision).
     Implements exponential backoff and respects max retry limits.
     """
-    engine = WorkflowEngine(db_session, event_bus)
-
     try:
         workflow = await engine.retry_workflow(workflow_id)
 
@@ -213,8 +267,7 @@ async def rollback_workflow(
     target_state: WorkflowState,
     reason: str = "Manual rollback",
     rollback_by: str = "user",
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Rollback a workflow to a previous state.
@@ -224,7 +277,6 @@ async def rollback_workflow(
     logger.info("api_rollback_workflow", workflow_id=workflow_id, target_state=target_state.value)
 
     try:
-        engine = WorkflowEngine(db_session, event_bus)
         workflow = await engine.rollback_workflow(
             workflow_id=workflow_id,
             target_state=target_state,
@@ -260,13 +312,11 @@ async def rollback_workflow(
 async def check_can_rollback(
     workflow_id: str,
     target_state: WorkflowState,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Check if a workflow can be rolled back to a specific state.
     """
-    engine = WorkflowEngine(db_session, event_bus)
     can_rollback = await engine.can_rollback(workflow_id, target_state)
 
     return {
@@ -279,13 +329,11 @@ async def check_can_rollback(
 @router.get("/{workflow_id}/rollback-history")
 async def get_rollback_history(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """
     Get the rollback history for a workflow.
     """
-    engine = WorkflowEngine(db_session, event_bus)
     history = await engine.get_rollback_history(workflow_id)
 
     return {
@@ -295,13 +343,27 @@ async def get_rollback_history(
     }
 
 
+@router.get("/{workflow_id}/rollback-info")
+async def get_rollback_info(
+    workflow_id: str,
+    target_state: WorkflowState,
+    engine: WorkflowEngine = Depends(get_workflow_engine),
+):
+    """
+    Check rollback eligibility and fetch rollback history in one request.
+    Combines can-rollback and rollback-history.
+    """
+    try:
+        return await engine.get_rollback_info(workflow_id, target_state)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @router.get("/{workflow_id}/steps", response_model=List[WorkflowStepResponse])
 async def get_workflow_steps(
     workflow_id: str,
-    db_session = Depends(get_db),
-    event_bus = Depends(get_event_bus),
+    engine: WorkflowEngine = Depends(get_workflow_engine),
 ):
     """Get all steps for a workflow"""
-    engine = WorkflowEngine(db_session, event_bus)
     steps = await engine.get_workflow_steps(workflow_id)
     return [WorkflowStepResponse(**step.to_dict()) for step in steps]
\ No newline at end of file
@@ -3,17 +3,41 @@ Security utilities for callback token generation and verification.
 Uses HMAC for cryptographically secure tokens.
 """
 
-import secrets
+import os
+import base64
 import hmac
 import hashlib
 import time
 from typing import Optional
 
+import structlog
+from cachetools import TTLCache
+
 from app.config.settings import settings
 
 # Get secret key from settings
 SECRET_KEY = settings.secret_key
 SLACK_SIGNING_SECRET = settings.slack_signing_secret or ""
+SLACK_MAX_REQUEST_AGE = settings.slack_request_max_age_seconds
+
+logger = structlog.get_logger()
+
+_b64encode = base64.urlsafe_b64encode
+
+# Keyed HMAC state for callback tokens (see _SLACK_HMAC below)
+_CALLBACK_HMAC = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+# Keyed HMAC state for Slack signatures: the inner/outer key pads are derived
+# once at import time and each request works on a cheap .copy()
+_SLACK_HMAC = hmac.new(SLACK_SIGNING_SECRET.encode(), digestmod=hashlib.sha256)
+
+# Verified token -> approval_id. Only successful verifications are stored, so
+# invalid tokens cannot fill the cache and evict the real ones.
+# TTL never exceeds the default approval lifetime so entries cannot outlive the approval.
+_verified_tokens: TTLCache = TTLCache(
+    maxsize=4096,
+    ttl=settings.default_approval_timeout_seconds,
+)
 
 
 def generate_callback_token(approval_id: str) -> str:
@@ -29,11 +53,13 @@ def generate_callback_token(approval_id: str) -> str:
         Secure callback token
     """
     # Generate cryptographically secure random part
-    random_part = secrets.token_urlsafe(16)
+    random_part = _urlsafe_token(16)
 
     # Create HMAC signature
     message = f"{approval_id}:{random_part}".encode()
-    signature = hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:16]
+    mac = _CALLBACK_HMAC.copy()
+    mac.update(message)
+    signature = mac.hexdigest()[:16]
 
     # Combine into token
     token = f"{approval_id}:{random_part}:{signature}"
@@ -45,6 +71,10 @@ def verify_callback_token(token: str) -> Optional[str]:
     """
     Verify callback token and extract approval_id.
 
+    Verification is a pure function of the token and SECRET_KEY, so successful
+    results are cached - the button click -> modal submission flow skips the
+    HMAC recomputation. Rejections are not cached.
+
     Args:
         token: The callback token to verify
 
@@ -52,52 +82,78 @@ def verify_callback_token(token: str) -> Optional[str]:
         approval_id if valid, None otherwise
     """
     try:
-        import structlog
-        logger = structlog.get_logger()
+        return _verified_tokens[token]
+    except KeyError:
+        pass
 
-        # Log token verification attempt without exposing token value
-        logger.info("callback_token_verification_start", token_length=len(token))
+    approval_id = _verify_callback_token_uncached(token)
+    if approval_id is not None:
+        _verified_tokens[token] = approval_id
+    return approval_id
 
-        # Parse token
-        parts = token.split(":")
-        logger.info("token_parts_split", parts_count=len(parts))
 
-        if len(parts) != 3:
-            logger.warning("callback_token_invalid_format", expected_parts=3, actual_parts=len(parts))
+def _verify_callback_token_uncached(token: str) -> Optional[str]:
+    """Recompute the token signature and extract approval_id"""
+    try:
+        # Reject malformed tokens before allocating any parts
+        separator_count = token.count(":")
+        if separator_count != 2:
+            logger.warning(
+                "callback_token_invalid_format",
+                expected_parts=3,
+                actual_parts=separator_count + 1,
+                token_length=len(token),
+            )
             return None
 
-        approval_id, random_part, signature = parts
+        # Parse token
+        approval_id, random_part, signature = token.split(":", 2)
 
         # Recompute signature
         message = f"{approval_id}:{random_part}".encode()
-        expected_signature = hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:16]
-
-        # Log signature check without exposing actual signature values
-        signature_match = hmac.compare_digest(signature, expected_signature)
-        logger.info(
-            "callback_token_signature_check",
-            approval_id=approval_id,
-            signature_match=signature_match,
-        )
+        mac = _CALLBACK_HMAC.copy()
+        mac.update(message)
+        # Compare raw digest bytes (8 bytes = the 16 hex chars in the token)
+        signature_match = hmac.compare_digest(_decode_hex(signature, 16), mac.digest()[:8])
 
         # Constant-time comparison to prevent timing attacks
+        # (one log event per outcome, never exposing signature values)
         if not signature_match:
-            logger.warning("callback_token_signature_mismatch")
+            logger.warning("callback_token_signature_mismatch", approval_id=approval_id)
             return None
 
         logger.info("callback_token_valid", approval_id=approval_id)
         return approval_id
 
     except (ValueError, AttributeError) as e:
-        import structlog
-        logger = structlog.get_logger()
         logger.error("callback_token_verification_exception", error=str(e), exc_info=True)
         return None
 
 
+_LOWER_HEX = frozenset("0123456789abcdef")
+
+
+def _decode_hex(value: str, hex_length: int) -> bytes:
+    """
+    Decode a hex signature, mapping malformed input to b"" (never matches a digest).
+
+    Only the exact form we emit is accepted - `hex_length` lowercase hex chars.
+    bytes.fromhex alone would also take uppercase and whitespace, letting
+    several spellings of one signature verify.
+    """
+    if len(value) != hex_length or not _LOWER_HEX.issuperset(value):
+        return b""
+    return bytes.fromhex(value)
+
+
+def _urlsafe_token(nbytes: int) -> str:
+    """secrets.token_urlsafe without the extra wrapper layers"""
+    return _b64encode(os.urandom(nbytes)).rstrip(b"=").decode("ascii")
+
+
 def generate_idempotency_key() -> str:
     """Generate a random idempotency key"""
-    return secrets.token_urlsafe(32)
+    return _urlsafe_token(32)
 
 
 def verify_slack_signature(timestamp: str, body: bytes, signature: str) -> bool:
@@ -124,9 +180,6 @@ def verify_slack_signature(timestamp: str, body: bytes, signature: str) -> bool:
     # SECURITY: Fail closed if signing secret not configured
     # This prevents accepting unsigned requests if misconfigured
     if not SLACK_SIGNING_SECRET:
-        import structlog
-
-        logger = structlog.get_logger()
         logger.error(
             "slack_signing_secret_not_configured",
             message="SLACK_SIGNING_SECRET environment variable not set. " "All Slack requests will be rejected.",
@@ -135,46 +188,37 @@ def verify_slack_signature(timestamp: str, body: bytes, signature: str) -> bool:
         return False
 
     try:
-        import structlog
-        logger = structlog.get_logger()
-
         # Check timestamp to prevent replay attacks (must be < 5 minutes old)
-        current_time = int(time.time())
-        request_time = int(timestamp)
-        time_diff = abs(current_time - request_time)
-
-        logger.info(
-            "slack_signature_verification_attempt",
-            current_time=current_time,
-            request_time=request_time,
-            time_diff_seconds=time_diff,
-            timestamp_valid=time_diff <= 300,
-        )
+        time_diff = int(time.time()) - int(timestamp, 10)
 
-        if time_diff > 300:  # 5 minutes
+        if not -SLACK_MAX_REQUEST_AGE <= time_diff <= SLACK_MAX_REQUEST_AGE:
             logger.warning("slack_signature_timestamp_too_old", time_diff_seconds=time_diff)
             return False
 
-        # Compute expected signature
+        # Compute expected signature over "v0:{timestamp}:{body}", feeding the
+        # pieces separately so the body is never copied into a joined buffer
         # TODO: Check this on more use cases.
-        sig_basestring = f"v0:{timestamp}:{body.decode('utf-8')}"
-        expected_signature = (
-            "v0=" + hmac.new(SLACK_SIGNING_SECRET.encode(), sig_basestring.encode(), hashlib.sha256).hexdigest()
-        )
+        mac = _SLACK_HMAC.copy()
+        mac.update(b"v0:")
+        mac.update(timestamp.encode("ascii"))
+        mac.update(b":")
+        mac.update(body)
 
-        # Verify signature without exposing actual values in logs
-        signature_match = hmac.compare_digest(signature, expected_signature)
+        # Compare raw digest bytes instead of formatting our digest as hex
+        provided_digest = _decode_hex(signature[3:], 64) if signature.startswith("v0=") else b""
+        signature_match = hmac.compare_digest(provided_digest, mac.digest())
+
+        # Single log event per verification, without exposing actual values
         logger.info(
-            "slack_signature_comparison",
+            "slack_signature_verified",
             signature_match=signature_match,
             signature_length=len(signature),
+            time_diff_seconds=time_diff,
         )
 
         # Constant-time comparison to prevent timing attacks
         return signature_match
 
     except (ValueError, AttributeError) as e:
-        import structlog
-        logger = structlog.get_logger()
         logger.error("slack_signature_verification_exception", error=str(e), exc_info=True)
         return False
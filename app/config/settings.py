@@ -54,11 +54,16 @@ class Settings(BaseSettings):
     slack_bot_token: Optional[str] = None
     slack_channel_id: Optional[str] = None
     slack_signing_secret: Optional[str] = None
+    slack_request_max_age_seconds: int = 300  # Replay window for X-Slack-Request-Timestamp
+    slack_max_body_bytes: int = 65536  # Reject larger interaction payloads unread
 
     # Timeout Configuration
     default_approval_timeout_seconds: int = 3600  # 1 hour
     max_workflow_duration_seconds: int = 86400  # 24 hours
     timeout_check_interval_seconds: int = 10
+    timeout_batch_size: int = 1000  # Max expired approvals handled per check
+    timeout_idle_recheck_seconds: int = 300  # Max sleep when no approval deadline is known
+    timeout_error_max_backoff_seconds: int = 300  # Cap on the back-off after failed checks
 
     # Retry Configuration
     max_retry_attempts: int = 3
@@ -74,6 +79,14 @@ class Settings(BaseSettings):
     # Event Bus Configuration
     event_bus_max_queue_size: int = 1000
     event_bus_max_retries: int = 3
+    event_bus_batch_size: int = 64  # Max events drained per dispatch round
+
+    # Dead Letter Queue Configuration
+    dlq_retry_workers: int = 32  # Concurrent publishers for bulk DLQ retry
+    dlq_retry_queue_size: int = 1000  # Bounded hand-off queue for bulk DLQ retry
+    dlq_stream_batch_size: int = 500  # Rows fetched per chunk when streaming the DLQ
+    dlq_retry_publish_timeout_seconds: float = 2.0  # Per-entry publish timeout in bulk DLQ retry
+    dlq_write_batch_size: int = 32  # Max DLQ entries committed per transaction
 
     # Idempotency Configuration
     idempotency_key_expiry_hours: int = 24
@@ -86,7 +99,10 @@ class Settings(BaseSettings):
         env_file=".env",
         env_file_encoding="utf-8",
         case_sensitive=False,
-        extra="ignore"
+        extra="ignore",
+        # Settings are read-only after startup; modules snapshot derived values
+        # (e.g. HMAC key state in security.py) at import time
+        frozen=True,
     )
 
     @property
@@ -4,18 +4,156 @@ Handles creation, response, and timeout of approval requests.
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime, timedelta
-from typing import List
-import json
+from sqlalchemy import Row, bindparam, func, insert, literal, select, update
+import time
+from typing import Callable, List, Optional
+import uuid
 import structlog
+from cachetools import LRUCache, TTLCache
 
-from app.models.orm import ApprovalRequest, Workflow, WorkflowEvent
+from app.models.orm import ApprovalRequest, Workflow, WorkflowEvent, WorkflowStep
+from app.models.serialization import json_dumps, json_loads
 from app.models.schemas import ApprovalUISchema, ApprovalStatus, EventType, WorkflowState
 from app.config.security import generate_callback_token
+from app.config.settings import settings
 
 logger = structlog.get_logger()
 
+# approval_id -> validated ApprovalUISchema.
+# A UI schema never changes after the approval is created, so interactive
+# channels (Slack buttons/modals) can skip re-running Pydantic validation.
+_ui_schema_cache: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+
+# ui_schema JSON -> compiled response validator (None when the schema has no fields).
+# Approvals of the same workflow type share a schema, so they share a validator.
+_response_validator_cache: LRUCache = LRUCache(maxsize=1024)
+
+
+def _compile_response_validator(ui_schema_dict: dict) -> Callable[[str, dict], int]:
+    """
+    Precompute required field names and allowed select values for a UI schema.
+
+    The returned callable raises ValueError for an invalid response and
+    returns the number of schema fields otherwise.
+    """
+    fields = ui_schema_dict['fields']
+    field_count = len(fields)
+    required_fields = tuple(field['name'] for field in fields if field.get('required', False))
+
+    select_fields = []
+    for field in fields:
+        if field['type'] == 'select' and field.get('options'):
+            # Options can be dicts with 'value' key or simple strings
+            valid_values = [
+                opt.get('value', opt.get('label')) if isinstance(opt, dict) else opt
+                for opt in field['options']
+            ]
+            select_fields.append((field['name'], valid_values, frozenset(valid_values)))
+
+    def validate(approval_id: str, response_data: dict) -> int:
+        # Validate required fields
+        for field_name in required_fields:
+            if field_name not in response_data or not response_data[field_name]:
+                logger.warning(
+                    "validation_required_field_missing",
+                    approval_id=approval_id,
+                    field_name=field_name
+                )
+                raise ValueError(
+                    f"Required field '{field_name}' missing in response"
+                )
+
+        # Validate field types (basic validation)
+        for field_name, valid_values, allowed in select_fields:
+            if field_name in response_data:
+                value = response_data[field_name]
+                try:
+                    is_valid = value in allowed
+                except TypeError:  # unhashable value (e.g. a list) is never a valid option
+                    is_valid = False
+
+                if not is_valid:
+                    logger.warning(
+                        "validation_invalid_select_value",
+                        approval_id=approval_id,
+                        field_name=field_name,
+                        value=value,
+                        allowed_options=valid_values
+                    )
+                    raise ValueError(
+                        f"Invalid value '{value}' for field '{field_name}'. "
+                        f"Must be one of: {valid_values}"
+                    )
+
+        return field_count
+
+    return validate
+
+
+def _get_response_validator(ui_schema_json: str) -> Optional[Callable[[str, dict], int]]:
+    """Get the compiled validator for a stored UI schema"""
+    try:
+        return _response_validator_cache[ui_schema_json]
+    except KeyError:
+        pass
+
+    ui_schema_dict = json_loads(ui_schema_json)
+    validator = None
+    if ui_schema_dict and 'fields' in ui_schema_dict:
+        validator = _compile_response_validator(ui_schema_dict)
+
+    _response_validator_cache[ui_schema_json] = validator
+    return validator
+
+
+# Shared SlackAdapter for result-message updates (created on first use -
+# the adapter reads settings and logs once at construction)
+_slack_adapter = None
+
+
+def _get_slack_adapter():
+    """Get the lazily created SlackAdapter singleton"""
+    global _slack_adapter
+    if _slack_adapter is None:
+        from app.adapters.slack import SlackAdapter
+
+        _slack_adapter = SlackAdapter()
+    return _slack_adapter
+
+
+# Timeout-poll statements, built once: each call only binds "now"/"limit",
+# so SQLAlchemy's compiled cache is hit without re-building the expression.
+_EXPIRED_APPROVALS_STMT = (
+    select(
+        ApprovalRequest.id,
+        ApprovalRequest.workflow_id,
+        Workflow.state.label("workflow_state"),
+        Workflow.version.label("workflow_version"),
+        Workflow.max_retries.label("workflow_max_retries"),
+    )
+    .outerjoin(Workflow, Workflow.id == ApprovalRequest.workflow_id)
+    .where(ApprovalRequest.status == ApprovalStatus.PENDING.value)
+    .where(ApprovalRequest.expires_at < bindparam("now"))
+    .order_by(ApprovalRequest.expires_at)
+    .limit(bindparam("limit"))
+    # Competing consumers: on Postgres each replica locks a disjoint batch
+    # until mark_timeout_bulk() commits (a no-op on SQLite)
+    .with_for_update(of=ApprovalRequest, skip_locked=True)
+)
+
+# Index-only probe: no join, no row locks, stops at the first match
+_HAS_EXPIRED_STMT = (
+    select(literal(1))
+    .where(ApprovalRequest.status == ApprovalStatus.PENDING.value)
+    .where(ApprovalRequest.expires_at < bindparam("now"))
+    .limit(1)
+)
+
+_NEXT_EXPIRY_STMT = (
+    select(func.min(ApprovalRequest.expires_at))
+    .where(ApprovalRequest.status == ApprovalStatus.PENDING.value)
+)
+
 
 class ApprovalService:
     """
@@ -43,61 +181,65 @@ class ApprovalService:
         Returns:
             Created approval request
         """
-        # Generate secure callback token
-        approval_id = None
-        callback_token = None
+        # Generate the ID client-side so the callback token is ready at INSERT time
+        # (no flush round-trip to learn the ID, no placeholder token)
+        approval_id = str(uuid.uuid4())
+        callback_token = generate_callback_token(approval_id)
+        now = time.time()
 
-        # Create approval request
-        approval = ApprovalRequest(
-            workflow_id=workflow_id,
-            status=ApprovalStatus.PENDING.value,
-            ui_schema=json.dumps(ui_schema.model_dump()),
-            expires_at=(datetime.now() + timedelta(seconds=timeout_seconds)).timestamp(),
-            callback_token="temp",  # Will be updated with real token
-        )
+        # Dump the schema once - it is persisted twice and published once
+        ui_schema_dict = ui_schema.model_dump()
 
-        self.db.add(approval)
-        await self.db.flush()
+        # Create approval request
+        approval_row = {
+            "id": approval_id,
+            "workflow_id": workflow_id,
+            "status": ApprovalStatus.PENDING.value,
+            "ui_schema": json_dumps(ui_schema_dict),
+            "requested_at": now,
+            "expires_at": now + timeout_seconds,
+            "callback_token": callback_token,
+        }
 
-        # Now generate token with the real approval ID
-        callback_token = generate_callback_token(approval.id)
-        approval.callback_token = callback_token
+        # Record event in workflow event log (so it appears in event history)
+        event_row = {
+            "workflow_id": workflow_id,
+            "event_type": EventType.APPROVAL_REQUESTED.value,
+            "event_data": json_dumps({
+                "approval_id": approval_id,
+                "workflow_id": workflow_id,
+                "ui_schema": ui_schema_dict,
+                "expires_at": approval_row["expires_at"],
+                "callback_token": callback_token,
+            }),
+            "occurred_at": now,
+        }
 
+        # Write-only rows: plain INSERTs in one transaction, skipping the
+        # session's unit-of-work bookkeeping for objects we never modify
+        await self.db.execute(insert(ApprovalRequest).values(**approval_row))
+        await self.db.execute(insert(WorkflowEvent).values(**event_row))
         await self.db.commit()
-        await self.db.refresh(approval)
+
+        # Every column is known client-side, so the returned instance needs no reload
+        approval = ApprovalRequest(**approval_row)
 
         logger.info(
             "approval_requested",
-            approval_id=approval.id,
+            approval_id=approval_id,
             workflow_id=workflow_id,
             expires_at=approval.expires_at,
             timeout_seconds=timeout_seconds,
         )
 
-        # Record event in workflow event log (so it appears in event history)
-        event = WorkflowEvent(
-            workflow_id=workflow_id,
-            event_type=EventType.APPROVAL_REQUESTED.value,
-            event_data=json.dumps({
-                "approval_id": approval.id,
-                "workflow_id": workflow_id,
-                "ui_schema": ui_schema.model_dump(),
-                "expires_at": approval.expires_at,
-                "callback_token": callback_token,
-            }),
-            occurred_at=datetime.now().timestamp(),
-        )
-        self.db.add(event)
-        await self.db.flush()
-
         # Publish event to event bus
         if self.event_bus:
             await self.event_bus.publish(
                 EventType.APPROVAL_REQUESTED,
                 {
-                    "approval_id": approval.id,
+                    "approval_id": approval_id,
                     "workflow_id": workflow_id,
-                    "ui_schema": ui_schema.model_dump(),
+                    "ui_schema": ui_schema_dict,
                     "expires_at": approval.expires_at,
                     "callback_token": callback_token,
                 },
@@ -115,6 +257,14 @@ class ApprovalService:
 
         return approval
 
+    def get_ui_schema(self, approval: ApprovalRequest) -> ApprovalUISchema:
+        """Get the validated UI schema for an approval (cached per approval ID)"""
+        schema = _ui_schema_cache.get(approval.id)
+        if schema is None:
+            schema = ApprovalUISchema(**approval.ui_schema_dict)
+            _ui_schema_cache[approval.id] = schema
+        return schema
+
     async def get_approval_by_token(self, callback_token: str) -> ApprovalRequest:
         """Get approval request by callback token"""
         result = await self.db.execute(
@@ -136,8 +286,8 @@ class ApprovalService:
         """
         Process approval response (approve/reject).
 
-        Uses SELECT FOR UPDATE row-level locking to prevent race conditions
-        with concurrent approval responses or timeout manager.
+        The status change is a conditional UPDATE (still PENDING and not expired)
+        so concurrent responses and the timeout manager cannot both win.
 
         Args:
             approval_id: The approval request ID
@@ -150,16 +300,21 @@ class ApprovalService:
         Raises:
             ValueError: If approval not found, expired, or already processed
         """
-        # Get approval with row-level lock to prevent concurrent modifications
-        # with_for_update() will acquire the necessary locks
+        # Load approval for the fast-fail checks and schema validation below,
+        # together with its multi-step WorkflowStep id (if any) in the same query.
+        # No lock is held - the UPDATE further down re-checks status and expiry atomically.
         result = await self.db.execute(
-            select(ApprovalRequest).where(ApprovalRequest.id == approval_id).with_for_update()
+            select(ApprovalRequest, WorkflowStep.id)
+            .outerjoin(WorkflowStep, WorkflowStep.approval_id == ApprovalRequest.id)
+            .where(ApprovalRequest.id == approval_id)
         )
-        approval = result.scalar_one_or_none()
+        row = result.first()
 
-        if not approval:
+        if not row:
             raise ValueError(f"Approval {approval_id} not found")
 
+        approval, step_id = row
+
         # CRITICAL: Check expiry FIRST before status
         # This prevents race with timeout manager
         if approval.is_expired():
@@ -182,64 +337,52 @@ class ApprovalService:
             raise ValueError(f"Approval already {approval.status}")
 
         # VALIDATION: Check response against UI schema
-        ui_schema_dict = approval.ui_schema_dict
-        if ui_schema_dict and 'fields' in ui_schema_dict:
-            # Validate required fields
-            for field in ui_schema_dict['fields']:
-                if field.get('required', False):
-                    field_name = field['name']
-                    if field_name not in response_data or not response_data[field_name]:
-                        logger.warning(
-                            "validation_required_field_missing",
-                            approval_id=approval_id,
-                            field_name=field_name
-                        )
-                        raise ValueError(
-                            f"Required field '{field_name}' missing in response"
-                        )
-
-            # Validate field types (basic validation)
-            for field in ui_schema_dict['fields']:
-                field_name = field['name']
-                if field_name in response_data:
-                    value = response_data[field_name]
-                    field_type = field['type']
-
-                    if field_type == 'select' and field.get('options'):
-                        # Extract valid values from options (options can be dicts with 'value' key or simple strings)
-                        valid_values = []
-                        for opt in field['options']:
-                            if isinstance(opt, dict):
-                                valid_values.append(opt.get('value', opt.get('label')))
-                            else:
-                                valid_values.append(opt)
-
-                        if value not in valid_values:
-                            logger.warning(
-                                "validation_invalid_select_value",
-                                approval_id=approval_id,
-                                field_name=field_name,
-                                value=value,
-                                allowed_options=valid_values
-                            )
-                            raise ValueError(
-                                f"Invalid value '{value}' for field '{field_name}'. "
-                                f"Must be one of: {valid_values}"
-                            )
+        validator = _get_response_validator(approval.ui_schema)
+        if validator is not None:
+            fields_validated = validator(approval_id, response_data)
 
             logger.info(
                 "response_validation_passed",
                 approval_id=approval_id,
-                fields_validated=len(ui_schema_dict.get('fields', []))
+                fields_validated=fields_validated
             )
 
-        # Update approval
-        approval.status = ApprovalStatus.APPROVED.value if decision == "approve" else ApprovalStatus.REJECTED.value
-        approval.response_data = json.dumps(response_data)
-        approval.responded_at = datetime.now().timestamp()
+        # Update approval only if it is still PENDING and unexpired (single statement,
+        # RETURNING syncs the loaded instance)
+        now = time.time()
+        result = await self.db.execute(
+            update(ApprovalRequest)
+            .where(
+                ApprovalRequest.id == approval_id,
+                ApprovalRequest.status == ApprovalStatus.PENDING.value,
+                ApprovalRequest.expires_at >= now,
+            )
+            .values(
+                status=ApprovalStatus.APPROVED.value if decision == "approve" else ApprovalStatus.REJECTED.value,
+                response_data=json_dumps(response_data),
+                responded_at=now,
+            )
+            .returning(ApprovalRequest)
+        )
+
+        if result.scalar_one_or_none() is None:
+            # Lost a race with another response or the timeout manager
+            await self.db.refresh(approval)
+            logger.warning(
+                "approval_response_rejected_concurrent_update",
+                approval_id=approval_id,
+                workflow_id=approval.workflow_id,
+                current_status=approval.status,
+            )
+            if approval.status == ApprovalStatus.PENDING.value:
+                raise ValueError("Approval has expired")
+            raise ValueError(f"Approval already {approval.status}")
 
         await self.db.commit()
 
+        # Approval is settled - no further interactions need the cached schema
+        _ui_schema_cache.pop(approval_id, None)
+
         logger.info(
             "approval_received",
             approval_id=approval_id,
@@ -252,9 +395,7 @@ class ApprovalService:
         # Update Slack message if timestamp exists
         if approval.slack_message_ts:
             try:
-                from app.adapters.slack import SlackAdapter
-
-                slack = SlackAdapter()
+                slack = _get_slack_adapter()
                 if slack.is_configured():
                     result_blocks = slack.render_approval_result(decision, response_data)
                     await slack.update_message(
@@ -290,13 +431,7 @@ class ApprovalService:
             )
 
         # If this approval is part of a multi-step workflow, notify the engine
-        from app.models.orm import WorkflowStep
-        result = await self.db.execute(
-            select(WorkflowStep).where(WorkflowStep.approval_id == approval_id)
-        )
-        step = result.scalar_one_or_none()
-
-        if step:
+        if step_id is not None:
             # This is a multi-step workflow - let engine handle continuation
             from app.core.workflow_engine import WorkflowEngine
             engine = WorkflowEngine(self.db, self.event_bus)
@@ -312,7 +447,7 @@ class ApprovalService:
 
             if workflow:
                 workflow.state = WorkflowState.REJECTED.value
-                workflow.completed_at = datetime.now().timestamp()
+                workflow.completed_at = time.time()
                 await self.db.commit()
 
                 logger.info(
@@ -328,8 +463,8 @@ class ApprovalService:
         """
         Mark approval as timed out.
 
-        Uses SELECT FOR UPDATE row-level locking to prevent race conditions
-        with concurrent approval responses.
+        Only a still-PENDING approval is changed, in a single conditional
+        UPDATE, so a concurrent response always wins or loses cleanly.
 
         Args:
             approval_id: The approval request ID
@@ -337,18 +472,23 @@ class ApprovalService:
         Returns:
             Updated approval request (or unchanged if already processed)
         """
-        # Get approval with row-level lock to prevent concurrent modifications
-        # with_for_update() will acquire the necessary locks
         result = await self.db.execute(
-            select(ApprovalRequest).where(ApprovalRequest.id == approval_id).with_for_update()
+            update(ApprovalRequest)
+            .where(
+                ApprovalRequest.id == approval_id,
+                ApprovalRequest.status == ApprovalStatus.PENDING.value,
+            )
+            .values(
+                status=ApprovalStatus.TIMEOUT.value,
+                responded_at=time.time(),
+            )
+            .returning(ApprovalRequest)
         )
         approval = result.scalar_one_or_none()
 
         if not approval:
-            raise ValueError(f"Approval {approval_id} not found")
-
-        # Only timeout if still pending
-        if approval.status != ApprovalStatus.PENDING.value:
+            # Either missing or already processed - load it to tell which
+            approval = await self.get_approval(approval_id)
             logger.info(
                 "timeout_skipped_already_processed",
                 approval_id=approval_id,
@@ -357,9 +497,6 @@ class ApprovalService:
             )
             return approval
 
-        approval.status = ApprovalStatus.TIMEOUT.value
-        approval.responded_at = datetime.now().timestamp()
-
         await self.db.commit()
 
         logger.warning(
@@ -381,6 +518,61 @@ class ApprovalService:
 
         return approval
 
+    async def mark_timeout_bulk(self, approval_ids: List[str]) -> List[ApprovalRequest]:
+        """
+        Mark many approvals as timed out with one conditional UPDATE and one commit.
+
+        Same rule as mark_timeout(): only still-PENDING approvals change, so
+        approvals answered in the meantime are left alone.
+
+        Args:
+            approval_ids: The approval request IDs
+
+        Returns:
+            The approvals that were actually timed out
+        """
+        if not approval_ids:
+            return []
+
+        result = await self.db.execute(
+            update(ApprovalRequest)
+            .where(
+                ApprovalRequest.id.in_(approval_ids),
+                ApprovalRequest.status == ApprovalStatus.PENDING.value,
+            )
+            .values(
+                status=ApprovalStatus.TIMEOUT.value,
+                responded_at=time.time(),
+            )
+            .returning(ApprovalRequest)
+        )
+        approvals = result.scalars().all()
+        await self.db.commit()
+
+        skipped = len(approval_ids) - len(approvals)
+        if skipped:
+            logger.info("timeout_skipped_already_processed", count=skipped)
+
+        for approval in approvals:
+            logger.warning(
+                "approval_timeout",
+                approval_id=approval.id,
+                workflow_id=approval.workflow_id,
+                expired_at=approval.expires_at,
+            )
+
+            # Publish event
+            if self.event_bus:
+                await self.event_bus.publish(
+                    EventType.APPROVAL_TIMEOUT,
+                    {
+                        "approval_id": approval.id,
+                        "workflow_id": approval.workflow_id,
+                    },
+                )
+
+        return approvals
+
     async def get_pending_approvals(self) -> List[ApprovalRequest]:
         """Get all pending approval requests"""
         result = await self.db.execute(
@@ -390,15 +582,33 @@ class ApprovalService:
         )
         return result.scalars().all()
 
-    async def get_expired_approvals(self) -> List[ApprovalRequest]:
-        """Get all expired but still pending approvals"""
-        now = datetime.now().timestamp()
+    async def get_expired_approvals(self, limit: int = None) -> List[Row]:
+        """
+        Get expired but still pending approvals as rows of
+        (id, workflow_id, workflow_state, workflow_version, workflow_max_retries).
+
+        The workflow columns come from the same query (outer join, so an
+        approval whose workflow is gone still gets timed out), which spares the
+        timeout manager a separate workflow lookup. Each call is capped at
+        `limit` rows (settings.timeout_batch_size by default) so one tick never
+        processes an unbounded backlog. The (status, expires_at) index makes
+        this a range scan.
+        """
         result = await self.db.execute(
-            select(ApprovalRequest)
-            .where(ApprovalRequest.status == ApprovalStatus.PENDING.value)
-            .where(ApprovalRequest.expires_at < now)
+            _EXPIRED_APPROVALS_STMT,
+            {"now": time.time(), "limit": limit or settings.timeout_batch_size},
         )
-        return result.scalars().all()
+        return result.all()
+
+    async def has_expired_approvals(self) -> bool:
+        """Cheap check for any expired pending approval (one index lookup)"""
+        result = await self.db.execute(_HAS_EXPIRED_STMT, {"now": time.time()})
+        return result.first() is not None
+
+    async def get_next_expiry(self) -> Optional[float]:
+        """Earliest expires_at among pending approvals (None when nothing is pending)"""
+        result = await self.db.execute(_NEXT_EXPIRY_STMT)
+        return result.scalar()
 
     async def update_slack_message_ts(self, approval_id: str, message_ts: str):
         """Update the Slack message timestamp for later updates"""
@@ -420,15 +630,20 @@ class ApprovalService:
         Raises:
             ValueError: If approval not found or not in REJECTED state
         """
-        # Get approval with row-level lock
+        # Get approval with row-level lock, plus its multi-step WorkflowStep (if any)
         result = await self.db.execute(
-            select(ApprovalRequest).where(ApprovalRequest.id == approval_id).with_for_update()
+            select(ApprovalRequest, WorkflowStep)
+            .outerjoin(WorkflowStep, WorkflowStep.approval_id == ApprovalRequest.id)
+            .where(ApprovalRequest.id == approval_id)
+            .with_for_update(of=ApprovalRequest)
         )
-        approval = result.scalar_one_or_none()
+        row = result.first()
 
-        if not approval:
+        if not row:
             raise ValueError(f"Approval {approval_id} not found")
 
+        approval, step = row
+
         # Only allow rollback for REJECTED approvals
         if approval.status != ApprovalStatus.REJECTED.value:
             raise ValueError(f"Can only rollback rejected approvals. Current status: {approval.status}")
@@ -457,13 +672,7 @@ class ApprovalService:
         workflow = workflow_result.scalar_one_or_none()
 
         if workflow:
-            # Check if this is a multi-step workflow
-            from app.models.orm import WorkflowStep
-            step_result = await self.db.execute(
-                select(WorkflowStep).where(WorkflowStep.approval_id == approval_id)
-            )
-            step = step_result.scalar_one_or_none()
-
+            # Multi-step workflow if the approval belongs to a step (loaded above)
             if step:
                 # Multi-step workflow: set back to RUNNING and reset the step
                 workflow.state = WorkflowState.RUNNING.value
@@ -4,17 +4,28 @@ Provides pub/sub pattern for asynchronous event processing.
 """
 
 import asyncio
-from typing import Callable, Awaitable, Optional, Dict, List
-from collections import defaultdict
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Callable, Awaitable, Optional, Dict, List, Tuple
+from collections import defaultdict, deque
 import structlog
-import json
-from datetime import datetime
 
+from app.models.orm import DeadLetterQueue
 from app.models.schemas import EventType
+from app.models.serialization import json_dumps
 from app.config.settings import settings
 
 logger = structlog.get_logger()
 
+# Queued by stop() to wake the processor (and DLQ drainer) without a polling timeout
+_SHUTDOWN_SENTINEL = object()
+
+# True inside the processor task and the handler tasks it spawns. Publishes
+# from there skip back-pressure: the processor cannot free a slot while it
+# waits on its own handlers, so blocking them would deadlock the bus.
+_in_dispatch: ContextVar[bool] = ContextVar("event_bus_in_dispatch", default=False)
+
 
 class EventBus:
     """
@@ -23,12 +34,24 @@ class EventBus:
     """
 
     def __init__(self, max_queue_size: int = 1000, db = None):
-        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
-        self._handlers: Dict[EventType, List[Callable[[dict], Awaitable[None]]]] = defaultdict(list)
+        # Pending events: a plain deque plus a wake-up flag is cheaper than
+        # asyncio.Queue, which allocates a waiter future per blocking get()
+        self._pending: deque = deque()
+        self._has_events = asyncio.Event()
+        self._max_queue_size = max_queue_size
+        self._next_event_id = itertools.count(1)  # Cheap unique id per published event
+        # One slot per queued event; external publishers wait for a free slot
+        self._slots = asyncio.Semaphore(max_queue_size)
+        # Handler tuples are replaced (never mutated) on subscribe, so the
+        # processor can iterate them without copying or locking
+        self._handlers: Dict[EventType, Tuple[Callable[[dict], Awaitable[None]], ...]] = {}
         self._running = False
         self._processor_task: asyncio.Task = None
+        self._dlq_queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._dlq_task: Optional[asyncio.Task] = None
         self._db = db  # Database reference for DLQ
-        self._retry_counts: Dict[str, int] = {}  # Track retry counts per event
+        # Enum .value goes through a descriptor - resolve the names once for logging
+        self._event_names: Dict[EventType, str] = {t: t.value for t in EventType}
 
     def subscribe(self, event_type: EventType, handler: Callable[[dict], Awaitable[None]]):
         """
@@ -38,14 +61,29 @@ class EventBus:
             event_type: The event type to listen for
             handler: Async function that receives event data
         """
-        self._handlers[event_type].append(handler)
+        self._handlers[event_type] = self._handlers.get(event_type, ()) + (handler,)
         logger.info(
             "event_handler_subscribed",
-            event_type=event_type.value,
+            event_type=self._event_names[event_type],
             handler=handler.__name__,
             total_handlers=len(self._handlers[event_type]),
         )
 
+    def subscribe_many(self, mapping: Dict[EventType, List[Callable[[dict], Awaitable[None]]]]):
+        """
+        Subscribe several handlers at once (one tuple rebuild per event type, one log line).
+
+        Args:
+            mapping: Event type -> handlers to add for it
+        """
+        for event_type, handlers in mapping.items():
+            self._handlers[event_type] = self._handlers.get(event_type, ()) + tuple(handlers)
+
+        logger.info(
+            "event_handlers_subscribed",
+            counts={self._event_names[event_type]: len(self._handlers[event_type]) for event_type in mapping},
+        )
+
     async def publish(self, event_type: EventType, data: dict):
         """
         Publish an event to the bus.
@@ -54,12 +92,31 @@ class EventBus:
             event_type: The type of event
             data: Event payload
         """
-        try:
-            await self._queue.put({"type": event_type, "data": data})
-            logger.debug("event_published", event_type=event_type.value, queue_size=self._queue.qsize())
-        except asyncio.QueueFull:
-            logger.error("event_queue_full", event_type=event_type.value, data=data)
-            raise
+        # Nobody listens for this type - skip the enqueue/dequeue round-trip.
+        # Safe because handlers are only ever added, never removed.
+        if event_type not in self._handlers:
+            logger.debug("event_dropped_no_handlers", event_type=self._event_names[event_type])
+            return
+
+        # Back-pressure: wait for the processor to catch up instead of failing.
+        # Handlers publishing follow-up events are exempt (see _in_dispatch).
+        holds_slot = not _in_dispatch.get()
+        if holds_slot:
+            if self._slots.locked():
+                logger.warning("event_queue_full", event_type=self._event_names[event_type])
+            await self._slots.acquire()
+
+        # Retry counts ride on the envelope (keyed by handler), so they are
+        # released with the event instead of living in a shared dict
+        self._pending.append({
+            "id": next(self._next_event_id),
+            "type": event_type,
+            "data": data,
+            "_retries": defaultdict(int),
+            "_holds_slot": holds_slot,
+        })
+        self._has_events.set()
+        logger.debug("event_published", event_type=self._event_names[event_type], queue_size=len(self._pending))
 
     async def start(self):
         """Start the event processor"""
@@ -69,6 +126,8 @@ class EventBus:
 
         self._running = True
         self._processor_task = asyncio.create_task(self._process_events())
+        if self._db:
+            self._dlq_task = asyncio.create_task(self._drain_dlq())
         logger.info("event_bus_started")
 
     async def stop(self):
@@ -79,13 +138,27 @@ class EventBus:
         self._running = False
 
         if self._processor_task:
-            self._processor_task.cancel()
+            # Wake the processor with a sentinel so the event in flight finishes cleanly
+            self._pending.append(_SHUTDOWN_SENTINEL)
+            self._has_events.set()
             try:
                 await self._processor_task
             except asyncio.CancelledError:
                 pass
 
-        logger.info("event_bus_stopped", pending_events=self._queue.qsize())
+        # Events left behind are never processed - free their slots so
+        # publishers blocked on back-pressure are not stuck forever
+        for event in self._pending:
+            if event is not _SHUTDOWN_SENTINEL and event["_holds_slot"]:
+                self._slots.release()
+
+        if self._dlq_task:
+            # Flush DLQ entries queued before shutdown
+            await self._dlq_queue.put(_SHUTDOWN_SENTINEL)
+            await self._dlq_task
+            self._dlq_task = None
+
+        logger.info("event_bus_stopped", pending_events=len(self._pending))
 
     async def _process_events(self):
         """
@@ -93,42 +166,70 @@ class EventBus:
         Runs handlers for each event type.
         """
         logger.info("event_processor_started")
+        max_batch = settings.event_bus_batch_size
+        # Inherited by every handler task created below
+        _in_dispatch.set(True)
 
         while self._running:
             try:
-                # Wait for event with timeout to allow clean shutdown
-                event = await asyncio.wait_for(self._queue.get(), timeout=1.0)
-
-                event_type = event["type"]
-                event_data = event["data"]
-
-                handlers = self._handlers.get(event_type, [])
-
-                if not handlers:
-                    logger.warning("no_handlers_for_event", event_type=event_type.value)
-                    continue
-
-                logger.debug(
-                    "processing_event",
-                    event_type=event_type.value,
-                    handlers=len(handlers),
-                    data=event_data,
-                )
-
-                # Generate event ID for tracking retries
-                event_id = f"{event_type.value}:{id(event_data)}"
+                # Sleep until an event arrives - stop() wakes us with a sentinel
+                while not self._pending:
+                    self._has_events.clear()
+                    await self._has_events.wait()
+                event = self._pending.popleft()
+
+                if event is _SHUTDOWN_SENTINEL:
+                    break
+                if not self._running:
+                    # Left unprocessed on shutdown - hand it back so stop() frees its slot
+                    self._pending.appendleft(event)
+                    break
+
+                # Drain whatever else is already queued so a burst is dispatched
+                # in one round instead of one round per event
+                batch = [event]
+                shutting_down = False
+                while len(batch) < max_batch and self._pending:
+                    event = self._pending.popleft()
+                    if event is _SHUTDOWN_SENTINEL:
+                        shutting_down = True
+                        break
+                    batch.append(event)
+
+                # Slots bound the queue, not in-flight work: free them as soon as
+                # the events leave the queue so handlers never wait on themselves
+                for event in batch:
+                    if event["_holds_slot"]:
+                        self._slots.release()
+
+                events_by_type: Dict[EventType, List[dict]] = defaultdict(list)
+                for event in batch:
+                    events_by_type[event["type"]].append(event)
+
+                # Run all handlers for the batch concurrently. _run_handler
+                # swallows handler errors, so the group never cancels siblings.
+                async with asyncio.TaskGroup() as tg:
+                    for event_type, events in events_by_type.items():
+                        handlers = self._handlers.get(event_type)
+
+                        if not handlers:
+                            logger.warning("no_handlers_for_event", event_type=self._event_names[event_type])
+                            continue
+
+                        logger.debug(
+                            "processing_events",
+                            event_type=self._event_names[event_type],
+                            handlers=len(handlers),
+                            events=len(events),
+                        )
+
+                        for event in events:
+                            for handler in handlers:
+                                tg.create_task(self._run_handler(handler, event, event_type))
+
+                if shutting_down:
+                    break
 
-                # Run all handlers concurrently
-                handler_tasks = [
-                    self._run_handler(handler, event_data, event_type, event_id)
-                    for handler in handlers
-                ]
-
-                await asyncio.gather(*handler_tasks, return_exceptions=True)
-
-            except asyncio.TimeoutError:
-                # No events in queue, continue loop
-                continue
             except asyncio.CancelledError:
                 logger.info("event_processor_cancelled")
                 break
@@ -137,23 +238,24 @@ class EventBus:
 
         logger.info("event_processor_stopped")
 
-    async def _run_handler(self, handler: Callable, data: dict, event_type: EventType, event_id: str):
+    async def _run_handler(self, handler: Callable, event: dict, event_type: EventType):
         """
         Run a single handler with error handling and DLQ support.
         """
+        data = event["data"]
         try:
             await handler(data)
-            # CRITICAL: Clean up successful events to prevent memory leak
-            self._retry_counts.pop(event_id, None)
         except Exception as e:
-            # Track retry count for this event
-            retry_count = self._retry_counts.get(event_id, 0) + 1
-            self._retry_counts[event_id] = retry_count
+            # Track retry count for this handler on this event
+            retries = event["_retries"]
+            retries[id(handler)] += 1
+            retry_count = retries[id(handler)]
 
             logger.error(
                 "event_handler_error",
                 handler=handler.__name__,
-                event_type=event_type.value,
+                event_type=self._event_names[event_type],
+                event_id=event["id"],
                 error=str(e),
                 retry_count=retry_count,
                 exc_info=True,
@@ -162,12 +264,11 @@ class EventBus:
             # Move to DLQ after max retries
             if retry_count >= settings.event_bus_max_retries:
                 await self._move_to_dlq(event_type, data, str(e), retry_count)
-                # Clean up retry counter
-                self._retry_counts.pop(event_id, None)
             else:
                 logger.info(
                     "event_will_retry",
-                    event_type=event_type.value,
+                    event_type=self._event_names[event_type],
+                    event_id=event["id"],
                     retry_count=retry_count,
                     max_retries=settings.event_bus_max_retries
                 )
@@ -179,47 +280,85 @@ class EventBus:
         if not self._db:
             logger.warning(
                 "dlq_disabled",
-                event_type=event_type.value,
+                event_type=self._event_names[event_type],
                 message="Database not configured for DLQ"
             )
             return
 
+        # Build the row now (so created_at is the failure time) and hand it to
+        # the drainer - the handler does not wait on a DB round-trip
         try:
-            from app.models import DeadLetterQueue
-
-            async with self._db.session() as session:
-                dlq_entry = DeadLetterQueue(
-                    original_event_type=event_type.value,
-                    event_data=json.dumps(event_data),
-                    error_message=error_message,
-                    retry_count=retry_count,
-                    created_at=datetime.now().timestamp(),
-                    workflow_id=event_data.get("workflow_id"),  # Optional workflow reference
-                )
-                session.add(dlq_entry)
-                await session.commit()
-
-                logger.warning(
-                    "event_moved_to_dlq",
-                    event_type=event_type.value,
-                    dlq_id=dlq_entry.id,
-                    error=error_message,
-                    retry_count=retry_count
-                )
+            dlq_entry = DeadLetterQueue(
+                original_event_type=self._event_names[event_type],
+                event_data=json_dumps(event_data),
+                error_message=error_message,
+                retry_count=retry_count,
+                created_at=time.time(),
+                workflow_id=event_data.get("workflow_id"),  # Optional workflow reference
+            )
         except Exception as dlq_error:
             logger.error(
                 "dlq_write_failed",
-                event_type=event_type.value,
+                event_type=self._event_names[event_type],
                 error=str(dlq_error),
                 exc_info=True
             )
+            return
+
+        await self._dlq_queue.put(dlq_entry)
+
+    async def _drain_dlq(self):
+        """
+        Background task that writes DLQ entries in micro-batches
+        (one session and one commit per batch).
+        """
+        max_batch = settings.dlq_write_batch_size
+
+        while True:
+            entry = await self._dlq_queue.get()
+            if entry is _SHUTDOWN_SENTINEL:
+                break
+
+            batch = [entry]
+            shutting_down = False
+            while len(batch) < max_batch and not self._dlq_queue.empty():
+                entry = self._dlq_queue.get_nowait()
+                if entry is _SHUTDOWN_SENTINEL:
+                    shutting_down = True
+                    break
+                batch.append(entry)
+
+            try:
+                async with self._db.session() as session:
+                    session.add_all(batch)
+                    await session.commit()
+
+                for dlq_entry in batch:
+                    logger.warning(
+                        "event_moved_to_dlq",
+                        event_type=dlq_entry.original_event_type,
+                        dlq_id=dlq_entry.id,
+                        error=dlq_entry.error_message,
+                        retry_count=dlq_entry.retry_count
+                    )
+            except Exception as dlq_error:
+                logger.error(
+                    "dlq_write_failed",
+                    event_types=[dlq_entry.original_event_type for dlq_entry in batch],
+                    error=str(dlq_error),
+                    exc_info=True
+                )
+
+            if shutting_down:
+                break
 
     def get_stats(self) -> dict:
         """Get event bus statistics"""
         return {
             "running": self._running,
-            "queue_size": self._queue.qsize(),
-            "max_queue_size": self._queue.maxsize,
+            "queue_size": len(self._pending),
+            "dlq_pending": self._dlq_queue.qsize(),
+            "max_queue_size": self._max_queue_size,
             "event_types": list(self._handlers.keys()),
             "total_handlers": sum(len(handlers) for handlers in self._handlers.values()),
         }
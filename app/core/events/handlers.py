@@ -1,5 +1,6 @@
 """Event handlers for workflow orchestration."""
 
+import asyncio
 import structlog
 from app.core import WorkflowEngine, ApprovalService, EventBus
 from app.models import Database
@@ -22,6 +23,8 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
         db: Database instance for session management
         slack_adapter: Slack adapter for notifications
     """
+    # Conversation updates (Agent Layer Feature) run inside the workflow handlers
+    from app.agent_layer import ConversationEventHandler
 
     async def handle_workflow_started(data: dict):
         """
@@ -32,14 +35,13 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
 
         async with db.session() as session:
             engine = WorkflowEngine(session, event_bus)
-            approval_service = ApprovalService(session, event_bus)
 
             workflow_id = data["workflow_id"]
             context = data["context"]
             approval_timeout = data.get("approval_timeout_seconds", 3600)
 
-            # Check if this is a multi-step workflow
-            workflow = await engine.get_workflow(workflow_id)
+            # Check if this is a multi-step workflow (the event already carries
+            # the context, so the workflow row itself is not needed here)
             steps = await engine.get_workflow_steps(workflow_id)
 
             if steps and len(steps) > 0:
@@ -60,6 +62,7 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
                 # Create the actual approval request
                 ui_schema = ApprovalUISchema(**context["_approval_schema"])
                 timeout = context.get("_approval_timeout", approval_timeout)
+                approval_service = ApprovalService(session, event_bus)
                 await approval_service.request_approval(workflow_id, ui_schema, timeout)
 
                 logger.info(
@@ -72,34 +75,46 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
                 logger.info("no_approval_needed", workflow_id=workflow_id)
                 await engine.mark_completed(workflow_id, {"auto_approved": True})
 
-    async def handle_approval_requested(data: dict):
-        """When approval is requested, send to Slack"""
-        logger.info("handling_approval_requested", data=data)
-
+    async def send_approval_to_slack(data: dict):
+        """Post the approval request to Slack; returns the API result or None on failure."""
         approval_id = data["approval_id"]
-        ui_schema_dict = data["ui_schema"]
-        callback_token = data["callback_token"]
 
         # Convert dict back to Pydantic model
-        ui_schema = ApprovalUISchema(**ui_schema_dict)
+        ui_schema = ApprovalUISchema(**data["ui_schema"])
 
-        # Send to Slack
         try:
-            result = await slack_adapter.send_approval_request(ui_schema, approval_id, callback_token)
+            return await slack_adapter.send_approval_request(ui_schema, approval_id, data["callback_token"])
+        except Exception as e:
+            logger.error("slack_send_failed", approval_id=approval_id, error=str(e))
+            return None
+
+    async def handle_approval_requested(data: dict):
+        """
+        When approval is requested, send to Slack and update the linked conversation.
 
-            if result.get("ok") and result.get("ts"):
+        Both updates share one session. The Slack call does not touch the session,
+        so it runs concurrently with the conversation update.
+        """
+        logger.info("handling_approval_requested", data=data)
+
+        approval_id = data["approval_id"]
+
+        async with db.session() as session:
+            result, _ = await asyncio.gather(
+                send_approval_to_slack(data),
+                ConversationEventHandler(session).on_approval_requested(data),
+            )
+
+            if result and result.get("ok") and result.get("ts"):
                 # Store Slack message timestamp for later updates
-                async with db.session() as session:
-                    approval_service = ApprovalService(session, event_bus)
-                    await approval_service.update_slack_message_ts(approval_id, result["ts"])
+                approval_service = ApprovalService(session, event_bus)
+                await approval_service.update_slack_message_ts(approval_id, result["ts"])
 
                 logger.info("slack_message_sent", approval_id=approval_id, ts=result["ts"])
-        except Exception as e:
-            logger.error("slack_send_failed", approval_id=approval_id, error=str(e))
 
     async def handle_approval_received(data: dict):
         """
-        When approval is received, update workflow state.
+        When approval is received, update the linked conversation and workflow state.
 
         ARCHITECTURAL TRADE-OFF:
         This handler has conditional logic based on whether approval_service already
@@ -131,6 +146,10 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
         approval_id = data.get("approval_id")
 
         async with db.session() as session:
+            # Conversation update first - it swallows its own errors, so a failed
+            # transition below cannot leave the conversation un-updated
+            await ConversationEventHandler(session).on_approval_received(data)
+
             engine = WorkflowEngine(session, event_bus)
 
             # Check if this is a multi-step workflow
@@ -180,15 +199,27 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
         workflow_id = data["workflow_id"]
         retry_count = data.get("retry_count", 1)
 
+        # The retry event carries the approval schema, so it is parsed before
+        # touching the DB and the workflow row does not have to be re-read
+        ui_schema = None
+        if "approval_schema" in data:
+            if data["approval_schema"]:
+                ui_schema = ApprovalUISchema(**data["approval_schema"])
+            timeout = data.get("approval_timeout", 3600)
+
         async with db.session() as session:
             engine = WorkflowEngine(session, event_bus)
-            approval_service = ApprovalService(session, event_bus)
 
-            # Re-request approval
-            workflow = await engine.get_workflow(workflow_id)
-            context = workflow.context_dict
+            if "approval_schema" not in data:
+                # Retry events published (or replayed from the DLQ) without the schema
+                workflow = await engine.get_workflow(workflow_id)
+                context = workflow.context_dict
+                if "_approval_schema" in context:
+                    ui_schema = ApprovalUISchema(**context["_approval_schema"])
+                timeout = context.get("_approval_timeout", 3600)
 
-            if "_approval_schema" in context:
+            # Re-request approval
+            if ui_schema is not None:
                 # Transition to WAITING_APPROVAL
                 await engine.transition_to(
                     workflow_id,
@@ -197,8 +228,7 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
                 )
 
                 # Create new approval request
-                ui_schema = ApprovalUISchema(**context["_approval_schema"])
-                timeout = context.get("_approval_timeout", 3600)
+                approval_service = ApprovalService(session, event_bus)
                 await approval_service.request_approval(workflow_id, ui_schema, timeout)
 
                 logger.info(
@@ -207,79 +237,32 @@ def register_event_handlers(event_bus: EventBus, db: Database, slack_adapter: Sl
                     retry_count=retry_count
                 )
 
-    # Subscribe handlers to events
-    event_bus.subscribe(EventType.WORKFLOW_STARTED, handle_workflow_started)
-    event_bus.subscribe(EventType.APPROVAL_REQUESTED, handle_approval_requested)
-    event_bus.subscribe(EventType.APPROVAL_RECEIVED, handle_approval_received)
-    event_bus.subscribe(EventType.APPROVAL_TIMEOUT, handle_approval_timeout)
-    event_bus.subscribe(EventType.APPROVAL_RETRY, handle_approval_retry)
-
-
-
-    # ========================================================================
-    # Conversation Event Handlers (Agent Layer Feature)
-    # ========================================================================
-    from app.agent_layer import ConversationEventHandler
-
-    # Create conversation handler instance (will be created per event)
-    async def create_conversation_handler_and_handle(event_type: str, event_data: dict):
-        """
-        Factory function that creates a ConversationEventHandler with DB session
-        and calls the appropriate method based on event type.
-        """
-        async with db.session() as session:
-            handler = ConversationEventHandler(session)
-
-            if event_type == EventType.APPROVAL_REQUESTED.value:
-                await handler.on_approval_requested(event_data)
-            elif event_type == EventType.APPROVAL_RECEIVED.value:
-                await handler.on_approval_received(event_data)
-            elif event_type == EventType.WORKFLOW_COMPLETED.value:
-                await handler.on_workflow_completed(event_data)
-            elif event_type == EventType.WORKFLOW_FAILED.value:
-                await handler.on_workflow_failed(event_data)
-            elif event_type == EventType.STEP_COMPLETED.value:
-                await handler.on_step_completed(event_data)
-
-    # Register conversation event handlers
-    async def handle_approval_requested_conv(data):
-        await create_conversation_handler_and_handle(
-            EventType.APPROVAL_REQUESTED.value, data
-        )
-
-    async def handle_approval_received_conv(data):
-        await create_conversation_handler_and_handle(
-            EventType.APPROVAL_RECEIVED.value, data
-        )
-
-    async def handle_workflow_completed_conv(data):
-        await create_conversation_handler_and_handle(
-            EventType.WORKFLOW_COMPLETED.value, data
-        )
-
-    async def handle_workflow_failed_conv(data):
-        await create_conversation_handler_and_handle(
-            EventType.WORKFLOW_FAILED.value, data
-        )
-
-    async def handle_step_completed_conv(data):
-        await create_conversation_handler_and_handle(
-            EventType.STEP_COMPLETED.value, data
-        )
-
-    event_bus.subscribe(EventType.APPROVAL_REQUESTED, handle_approval_requested_conv)
-    event_bus.subscribe(EventType.APPROVAL_RECEIVED, handle_approval_received_conv)
-    event_bus.subscribe(EventType.WORKFLOW_COMPLETED, handle_workflow_completed_conv)
-    event_bus.subscribe(EventType.WORKFLOW_FAILED, handle_workflow_failed_conv)
-    event_bus.subscribe(EventType.STEP_COMPLETED, handle_step_completed_conv)
-
-    logger.info(
-        "conversation_event_handlers_registered",
-        handlers=[
-            "APPROVAL_REQUESTED",
-            "APPROVAL_RECEIVED",
-            "WORKFLOW_COMPLETED",
-            "WORKFLOW_FAILED",
-            "STEP_COMPLETED",
-        ],
-    )
\ No newline at end of file
+    # Events that only update the linked conversation -> handler method
+    conversation_only_events = {
+        EventType.WORKFLOW_COMPLETED: ConversationEventHandler.on_workflow_completed,
+        EventType.WORKFLOW_FAILED: ConversationEventHandler.on_workflow_failed,
+        EventType.STEP_COMPLETED: ConversationEventHandler.on_step_completed,
+    }
+
+    def make_conversation_handler(method):
+        """Build a subscriber that runs one ConversationEventHandler method in its own session"""
+        async def handle_conversation_event(data: dict):
+            async with db.session() as session:
+                await method(ConversationEventHandler(session), data)
+
+        handle_conversation_event.__name__ = f"handle_{method.__name__}"
+        return handle_conversation_event
+
+    # Subscribe handlers to events - one handler per event type, so each
+    # event opens a single session
+    handlers = {
+        EventType.WORKFLOW_STARTED: [handle_workflow_started],
+        EventType.APPROVAL_REQUESTED: [handle_approval_requested],
+        EventType.APPROVAL_RECEIVED: [handle_approval_received],
+        EventType.APPROVAL_TIMEOUT: [handle_approval_timeout],
+        EventType.APPROVAL_RETRY: [handle_approval_retry],
+    }
+    for event_type, method in conversation_only_events.items():
+        handlers[event_type] = [make_conversation_handler(method)]
+
+    event_bus.subscribe_many(handlers)
@@ -1,5 +1,6 @@
 """Application startup and shutdown lifecycle management."""
 
+import asyncio
 from contextlib import asynccontextmanager
 import structlog
 from fastapi import FastAPI
@@ -18,7 +19,9 @@ async def lifespan(app: FastAPI):
     Modern FastAPI lifespan management for startup/shutdown.
     Manages background tasks for event processing and timeout checking.
     """
-    logger.info("application_starting")
+    # uvicorn picks uvloop when it is installed (uvicorn[standard], Linux/macOS only);
+    # the loop already exists by the time lifespan runs, so just report it
+    logger.info("application_starting", event_loop=type(asyncio.get_running_loop()).__module__)
 
     # Initialize database
     db = Database()
@@ -1,28 +1,59 @@
 """
 Timeout manager for checking and handling expired approvals.
-Runs as a background task checking for timeouts periodically.
+Runs as a background task that sleeps until the next approval deadline.
 """
 
 import asyncio
+import random
+import time
+from typing import Dict, Optional, Tuple
 import structlog
+from sqlalchemy import select
 
 from app.models.database import Database
+from app.models.orm import DeadLetterQueue, Workflow
+from app.models.serialization import json_dumps
+from app.models.schemas import EventType, WorkflowState
 from app.core.approval_service import ApprovalService
+from app.core.workflow_engine import WorkflowEngine
+from app.config.settings import settings
 
 logger = structlog.get_logger()
 
+# Sleep a little past a deadline so `expires_at < now` already holds on wake-up
+_DEADLINE_SLACK_SECONDS = 0.1
+
+# Workflows in these states are not moved to TIMEOUT when their approval expires
+_TERMINAL_STATES = frozenset({
+    WorkflowState.TIMEOUT.value,
+    WorkflowState.FAILED.value,
+    WorkflowState.COMPLETED.value,
+    WorkflowState.REJECTED.value,
+})
+
 
 class TimeoutManager:
     """
     Background service that checks for expired approvals.
     """
 
-    def __init__(self, db: Database, event_bus=None, check_interval: int = 10):
+    def __init__(self, db: Database, event_bus=None, check_interval: int = 10, max_concurrent: int = 8):
         self.db = db
         self.event_bus = event_bus
         self.check_interval = check_interval
+        self.max_concurrent = max_concurrent
+        # Caps concurrent workflow retries (each holds its own DB connection)
+        self._sem = asyncio.Semaphore(max_concurrent)
         self._running = False
         self._task: asyncio.Task = None
+        # Set when an approval with an earlier deadline than the one we sleep on appears
+        self._wakeup = asyncio.Event()
+        self._next_deadline: Optional[float] = None
+        # Failed checks in a row - drives the error back-off
+        self._consecutive_errors = 0
+
+        if event_bus:
+            event_bus.subscribe(EventType.APPROVAL_REQUESTED, self._on_approval_requested)
 
     async def start(self):
         """Start the timeout checker"""
@@ -42,7 +73,9 @@ class TimeoutManager:
         self._running = False
 
         if self._task:
-            self._task.cancel()
+            # Wake the loop out of its sleep; it sees _running=False and exits
+            # after finishing any check in flight - no cancellation needed
+            self._wakeup.set()
             try:
                 await self._task
             except asyncio.CancelledError:
@@ -50,172 +83,291 @@ class TimeoutManager:
 
         logger.info("timeout_manager_stopped")
 
+    def notify_new_deadline(self, expires_at: float):
+        """Wake the checker early if `expires_at` is sooner than the deadline it sleeps on"""
+        if self._next_deadline is None or expires_at < self._next_deadline:
+            self._next_deadline = expires_at
+            self._wakeup.set()
+
+    async def _on_approval_requested(self, data: dict):
+        """Event handler: a new (or rolled back) approval may carry an earlier deadline"""
+        # Rollback events carry no expires_at - re-check right away
+        self.notify_new_deadline(data.get("expires_at") or time.time())
+
     async def _check_timeouts_loop(self):
         """Background loop that checks for timeouts"""
         logger.info("timeout_checker_started")
 
         while self._running:
             try:
-                # Check immediately on first iteration, then sleep
-                await self._check_and_process_timeouts()
-                await asyncio.sleep(self.check_interval)
+                # Clear before checking so a deadline registered mid-check is not lost
+                self._wakeup.clear()
+
+                # Check immediately on first iteration, then sleep until the next deadline
+                processed = await self._check_and_process_timeouts()
+                delay = await self._next_wakeup_delay(processed)
+                self._consecutive_errors = 0
+
+                await self._sleep(delay)
 
             except asyncio.CancelledError:
                 logger.info("timeout_checker_cancelled")
                 break
             except Exception as e:
-                logger.error("timeout_checker_error", error=str(e), exc_info=True)
-                # Continue running even if one check fails
-                await asyncio.sleep(self.check_interval)
+                # Continue running even if one check fails, backing off so
+                # replicas hitting the same outage do not retry in lockstep
+                backoff = min(
+                    settings.timeout_error_max_backoff_seconds,
+                    self.check_interval * 2 ** self._consecutive_errors,
+                )
+                backoff += random.uniform(0, backoff * 0.3)
+                self._consecutive_errors += 1
+                logger.error(
+                    "timeout_checker_error",
+                    error=str(e),
+                    consecutive_errors=self._consecutive_errors,
+                    backoff_seconds=round(backoff, 1),
+                    exc_info=True,
+                )
+                await self._sleep(backoff)
 
         logger.info("timeout_checker_stopped")
 
-    async def _check_and_process_timeouts(self):
+    async def _sleep(self, delay: float):
+        """Sleep up to `delay` seconds; returns early on a new deadline or stop()"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _next_wakeup_delay(self, processed: int) -> float:
+        """Seconds to sleep before the next check"""
+        if processed >= settings.timeout_batch_size:
+            # Batch was capped - more expired approvals are waiting
+            return 0
+
+        async with self.db.session() as session:
+            next_deadline = await ApprovalService(session, self.event_bus).get_next_expiry()
+
+        self._next_deadline = next_deadline
+
+        if next_deadline is None:
+            # Nothing pending - new approvals wake us via notify_new_deadline()
+            return settings.timeout_idle_recheck_seconds
+
+        delay = next_deadline - time.time() + _DEADLINE_SLACK_SECONDS
+        if delay <= 0:
+            # Already expired but not processed (the last attempt failed) - back off
+            return self.check_interval
+        return min(delay, settings.timeout_idle_recheck_seconds)
+
+    async def _check_and_process_timeouts(self) -> int:
         """
         Check for expired approvals and process them.
 
-        Flow:
-        1. Mark approval as TIMEOUT
-        2. Transition workflow to TIMEOUT state (CRITICAL - required for retry_workflow)
-        3. Attempt retry
+        Flow (steps 1-2 run as set-based statements for the whole batch; the
+        workflow state comes with the expired-approval query):
+        1. Mark approvals as TIMEOUT
+        2. Transition workflows to TIMEOUT state (CRITICAL - required for retry_workflow)
+        3. Attempt retry per workflow
         4. If max retries exceeded, move to DLQ
         """
         async with self.db.session() as session:
             approval_service = ApprovalService(session, self.event_bus)
 
+            # Common case: nothing expired - skip the join and row locks below
+            if not await approval_service.has_expired_approvals():
+                return 0
+
             # Get all expired approvals
             expired_approvals = await approval_service.get_expired_approvals()
 
             if not expired_approvals:
-                return
+                return 0
 
             logger.info("expired_approvals_found", count=len(expired_approvals))
 
-            # Process each expired approval
-            for approval in expired_approvals:
-                try:
-                    # Mark approval as timed out
-                    await approval_service.mark_timeout(approval.id)
-
-                    # CRITICAL: Transition workflow to TIMEOUT state BEFORE retry
-                    # retry_workflow() requires workflow to be in TIMEOUT or FAILED state
-                    from app.core.workflow_engine import WorkflowEngine
-                    from app.models.schemas import WorkflowState
-
-                    workflow_engine = WorkflowEngine(session, self.event_bus)
-
-                    # Get workflow to check current state
-                    workflow = await workflow_engine.get_workflow(approval.workflow_id)
-
-                    # Only transition if not already in terminal state
-                    if workflow.state not in [
-                        WorkflowState.TIMEOUT.value,
-                        WorkflowState.FAILED.value,
-                        WorkflowState.COMPLETED.value,
-                        WorkflowState.REJECTED.value
-                    ]:
-                        await workflow_engine.transition_to(
-                            approval.workflow_id,
-                            WorkflowState.TIMEOUT,
-                            f"Approval {approval.id} timed out - no response received"
-                        )
-                        logger.info(
-                            "workflow_transitioned_to_timeout",
-                            workflow_id=approval.workflow_id,
-                            approval_id=approval.id
-                        )
+            workflow_engine = WorkflowEngine(session, self.event_bus)
+
+            # 1. Mark all approvals as timed out (one UPDATE); approvals answered
+            #    in the meantime are skipped
+            timed_out = {
+                approval.id
+                for approval in await approval_service.mark_timeout_bulk([a.id for a in expired_approvals])
+            }
+
+            # One timeout/retry per workflow, even if several of its approvals expired.
+            # The workflow columns were loaded with the approvals - no extra SELECT.
+            approval_by_workflow = {}
+            workflows = {}
+            for row in expired_approvals:
+                if row.id not in timed_out or row.workflow_id in approval_by_workflow:
+                    continue
+                approval_by_workflow[row.workflow_id] = row.id
+                if row.workflow_state is not None:
+                    workflows[row.workflow_id] = row
+
+            # 2. CRITICAL: Transition workflows to TIMEOUT state BEFORE retry (one UPDATE)
+            # retry_workflow() requires workflow to be in TIMEOUT or FAILED state
+            to_transition = {
+                workflow_id: (row.workflow_version, row.workflow_state)
+                for workflow_id, row in workflows.items()
+                if row.workflow_state not in _TERMINAL_STATES
+            }
+            transitioned = await workflow_engine.transition_to_bulk(
+                to_transition,
+                WorkflowState.TIMEOUT,
+                {
+                    workflow_id: f"Approval {approval_by_workflow[workflow_id]} timed out - no response received"
+                    for workflow_id in to_transition
+                },
+            )
+            transitioned_ids = {workflow.id for workflow in transitioned}
+            for workflow_id in transitioned_ids:
+                logger.info(
+                    "workflow_transitioned_to_timeout",
+                    workflow_id=workflow_id,
+                    approval_id=approval_by_workflow[workflow_id]
+                )
+            failed_transition_ids = to_transition.keys() - transitioned_ids
+
+            # 3. Retries stay per workflow (state machine + step resets), but distinct
+            #    workflows are independent, so they run concurrently
+            retries = []
+            for workflow_id, approval_id in approval_by_workflow.items():
+                if workflow_id not in workflows:
+                    logger.error(
+                        "timeout_processing_error",
+                        approval_id=approval_id,
+                        error=f"Workflow {workflow_id} not found",
+                    )
+                    continue
+                if workflow_id in failed_transition_ids:
+                    # Could not move to TIMEOUT - retry_workflow() would refuse it
+                    continue
+                retries.append(
+                    self._retry_after_timeout(workflow_id, approval_id, workflows[workflow_id].workflow_max_retries)
+                )
+
+        results = await asyncio.gather(*retries, return_exceptions=True)
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            # Full traceback once per batch (first failure as the sample), not per workflow
+            logger.error("timeout_batch_had_failures", count=len(failures), exc_info=failures[0])
+
+        # 4. Workflows out of retries go to the DLQ together (one session, one commit)
+        exhausted = dict(result for result in results if isinstance(result, tuple))
+        if exhausted:
+            await self._move_workflows_to_dlq(exhausted)
+
+        return len(expired_approvals)
+
+    async def _retry_after_timeout(
+        self, workflow_id: str, approval_id: str, max_retries: int
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Retry one timed-out workflow.
+
+        Runs in its own session (an AsyncSession cannot be shared between
+        concurrent tasks), capped by the concurrency semaphore.
 
+        Returns:
+            (workflow_id, max_retries) if retries are exhausted and the workflow
+            belongs in the DLQ, None otherwise
+        """
+        async with self._sem:
+            async with self.db.session() as session:
+                workflow_engine = WorkflowEngine(session, self.event_bus)
+
+                try:
                     # Attempt retry
-                    retry_result = await workflow_engine.retry_workflow(approval.workflow_id)
+                    retry_result = await workflow_engine.retry_workflow(workflow_id)
 
                     if retry_result:
                         logger.info(
                             "workflow_retry_after_timeout",
-                            workflow_id=approval.workflow_id,
-                            approval_id=approval.id,
+                            workflow_id=workflow_id,
+                            approval_id=approval_id,
                             retry_count=retry_result.retry_count,
                             max_retries=retry_result.max_retries
                         )
-                    else:
-                        # Max retries exceeded - move to DLQ
-                        logger.warning(
-                            "workflow_failed_max_retries",
-                            workflow_id=approval.workflow_id,
-                            approval_id=approval.id,
-                            message="Moving workflow to Dead Letter Queue"
-                        )
-
-                        # Move to DLQ
-                        await self._move_workflow_to_dlq(
-                            session,
-                            approval.workflow_id,
-                            f"Max retries ({workflow.max_retries}) exceeded after timeouts"
-                        )
+                        return None
+
+                    # Max retries exceeded - the caller moves it to the DLQ with the rest of the batch
+                    logger.warning(
+                        "workflow_failed_max_retries",
+                        workflow_id=workflow_id,
+                        approval_id=approval_id,
+                        message="Moving workflow to Dead Letter Queue"
+                    )
+                    return workflow_id, max_retries
 
                 except Exception as e:
+                    # No traceback here - the batch logs one sample (see _check_and_process_timeouts)
                     logger.error(
                         "timeout_processing_error",
-                        approval_id=approval.id,
+                        approval_id=approval_id,
+                        workflow_id=workflow_id,
                         error=str(e),
-                        exc_info=True,
                     )
+                    raise
 
-    async def _move_workflow_to_dlq(self, session, workflow_id: str, error_message: str):
+    async def _move_workflows_to_dlq(self, exhausted: Dict[str, int]):
         """
-        Move a failed workflow to the Dead Letter Queue.
+        Move failed workflows to the Dead Letter Queue.
+
+        All entries are added to one session and written with a single commit.
 
         Args:
-            session: Database session
-            workflow_id: The workflow that failed
-            error_message: Reason for DLQ
+            exhausted: Workflow id -> max retries it ran out of
         """
         try:
-            from app.models import DeadLetterQueue, Workflow
-            from sqlalchemy import select
-            import json
-            from datetime import datetime
-
-            # Get workflow details
-            result = await session.execute(
-                select(Workflow).where(Workflow.id == workflow_id)
-            )
-            workflow = result.scalar_one_or_none()
-
-            if not workflow:
-                logger.error("workflow_not_found_for_dlq", workflow_id=workflow_id)
-                return
-
-            # Create DLQ entry
-            dlq_entry = DeadLetterQueue(
-                original_event_type="workflow.timeout_max_retries_exceeded",
-                event_data=json.dumps({
-                    "workflow_id": workflow_id,
-                    "workflow_type": workflow.workflow_type,
-                    "state": workflow.state,
-                    "retry_count": workflow.retry_count,
-                    "max_retries": workflow.max_retries,
-                    "context": workflow.context_dict,
-                }),
-                error_message=error_message,
-                retry_count=workflow.retry_count,
-                created_at=datetime.now().timestamp(),
-                workflow_id=workflow_id,
-            )
-            session.add(dlq_entry)
-            await session.commit()
-
-            logger.warning(
-                "workflow_moved_to_dlq",
-                workflow_id=workflow_id,
-                dlq_id=dlq_entry.id,
-                retry_count=workflow.retry_count,
-                error=error_message
-            )
+            async with self.db.session() as session:
+                # Get workflow details for the whole batch
+                result = await session.execute(
+                    select(Workflow).where(Workflow.id.in_(exhausted))
+                )
+                workflows = {workflow.id: workflow for workflow in result.scalars()}
+
+                for workflow_id in exhausted.keys() - workflows.keys():
+                    logger.error("workflow_not_found_for_dlq", workflow_id=workflow_id)
+
+                # Create DLQ entries
+                now = time.time()
+                dlq_entries = [
+                    DeadLetterQueue(
+                        original_event_type="workflow.timeout_max_retries_exceeded",
+                        event_data=json_dumps({
+                            "workflow_id": workflow.id,
+                            "workflow_type": workflow.workflow_type,
+                            "state": workflow.state,
+                            "retry_count": workflow.retry_count,
+                            "max_retries": workflow.max_retries,
+                            "context": workflow.context_dict,
+                        }),
+                        error_message=f"Max retries ({exhausted[workflow.id]}) exceeded after timeouts",
+                        retry_count=workflow.retry_count,
+                        created_at=now,
+                        workflow_id=workflow.id,
+                    )
+                    for workflow in workflows.values()
+                ]
+                session.add_all(dlq_entries)
+                await session.commit()
+
+            for dlq_entry in dlq_entries:
+                logger.warning(
+                    "workflow_moved_to_dlq",
+                    workflow_id=dlq_entry.workflow_id,
+                    dlq_id=dlq_entry.id,
+                    retry_count=dlq_entry.retry_count,
+                    error=dlq_entry.error_message
+                )
 
         except Exception as e:
             logger.error(
                 "dlq_write_failed_for_workflow",
-                workflow_id=workflow_id,
+                workflow_ids=list(exhausted),
                 error=str(e),
                 exc_info=True
             )
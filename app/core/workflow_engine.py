@@ -4,19 +4,37 @@ Handles workflow lifecycle and state transitions.
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, func
+from sqlalchemy import Float, String, Text, bindparam, insert, select, update, func, tuple_
 from sqlalchemy.orm import selectinload
 from datetime import datetime
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Tuple, Union
 import json
 import structlog
 
-from app.models.orm import Workflow, WorkflowEvent
+from app.models.orm import IdempotencyKey, Workflow, WorkflowEvent, WorkflowStep
 from app.models.schemas import WorkflowState, EventType, STATE_TRANSITIONS
 from app.config.settings import settings
 
 logger = structlog.get_logger()
 
+# Only workflows in these states can be retried
+_RETRYABLE_STATES = frozenset({WorkflowState.TIMEOUT.value, WorkflowState.FAILED.value})
+
+# Append an event with the workflow's next sequence number in one statement:
+# INSERT ... SELECT max(sequence_number) + 1 - no separate read, and the
+# number is taken under the INSERT's own write lock
+_workflow_id_param = bindparam("workflow_id", type_=String)
+_RECORD_EVENT_STMT = insert(WorkflowEvent.__table__).from_select(
+    ["workflow_id", "event_type", "event_data", "occurred_at", "sequence_number"],
+    select(
+        _workflow_id_param,
+        bindparam("event_type", type_=String),
+        bindparam("event_data", type_=Text),
+        bindparam("occurred_at", type_=Float),
+        func.coalesce(func.max(WorkflowEvent.sequence_number), 0) + 1,
+    ).where(WorkflowEvent.workflow_id == _workflow_id_param),
+)
+
 
 # Task handler registry - register custom task handlers here
 TASK_HANDLERS = {}
@@ -69,9 +87,16 @@ class WorkflowEngine:
         workflow_type: str,
         context: dict,
         steps: Optional[List[dict]] = None,
-        approval_timeout_seconds: int = 3600
+        approval_timeout_seconds: int = 3600,
+        idempotency_key: Optional[str] = None,
     ) -> Workflow:
-        """Create a new workflow"""
+        """
+        Create a new workflow.
+
+        If idempotency_key is given, the caller's claim on that key is bound to
+        the new workflow in the same commit, so a failure after the commit can
+        never release the key and let a retry create a duplicate.
+        """
         workflow = Workflow(
             workflow_type=workflow_type,
             state=WorkflowState.CREATED.value,
@@ -81,18 +106,21 @@ class WorkflowEngine:
         self.db.add(workflow)
         await self.db.flush()
 
-        # Create workflow steps if provided
+        # Create workflow steps if provided (one multi-row INSERT)
         if steps:
-            from app.models.orm import WorkflowStep
-            for order, step_config in enumerate(steps):
-                step = WorkflowStep(
-                    workflow_id=workflow.id,
-                    step_order=order,
-                    step_type=step_config["type"],
-                    task_handler=step_config.get("handler"),
-                    task_input=json.dumps(step_config.get("input", {})) if step_config.get("input") else None
-                )
-                self.db.add(step)
+            await self.db.execute(
+                insert(WorkflowStep),
+                [
+                    {
+                        "workflow_id": workflow.id,
+                        "step_order": order,
+                        "step_type": step_config["type"],
+                        "task_handler": step_config.get("handler"),
+                        "task_input": json.dumps(step_config["input"]) if step_config.get("input") else None,
+                    }
+                    for order, step_config in enumerate(steps)
+                ],
+            )
 
         # Record creation event
         await self._record_event(
@@ -112,6 +140,13 @@ class WorkflowEngine:
             state=workflow.state,
         )
 
+        if idempotency_key:
+            await self.db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == idempotency_key)
+                .values(workflow_id=workflow.id)
+            )
+
         # CRITICAL: Commit BEFORE publishing event so handlers can read the workflow
         await self.db.commit()
 
@@ -143,15 +178,34 @@ class WorkflowEngine:
         Uses version-based concurrency control to prevent race conditions.
         Raises ConcurrentModificationError if workflow was modified concurrently.
         """
-        # Get workflow with current version
-        result = await self.db.execute(select(Workflow).where(Workflow.id == workflow_id))
-        workflow = result.scalar_one_or_none()
+        workflow, state_changed = await self._transition(workflow_id, new_state, reason)
+        # CRITICAL: Commit BEFORE publishing event so handlers can read the workflow
+        await self.db.commit()
+        await self._publish_state_changed(state_changed)
+        return workflow
 
-        if not workflow:
+    async def _transition(
+        self, workflow_id: str, new_state: WorkflowState, reason: str = None
+    ) -> Tuple[Workflow, dict]:
+        """
+        transition_to() without the commit or the publish, for callers that
+        bundle the transition with other changes into one transaction.
+
+        Returns:
+            The updated workflow and the WORKFLOW_STATE_CHANGED payload, which
+            the caller publishes (via _publish_state_changed) after committing
+        """
+        # Get current state and version (the full row comes back from the UPDATE)
+        result = await self.db.execute(
+            select(Workflow.state, Workflow.version).where(Workflow.id == workflow_id)
+        )
+        current = result.one_or_none()
+
+        if not current:
             raise ValueError(f"Workflow {workflow_id} not found")
 
-        current_state = WorkflowState(workflow.state)
-        old_version = workflow.version
+        current_state = WorkflowState(current.state)
+        old_version = current.version
 
         # Validate transition
         if new_state not in STATE_TRANSITIONS.get(current_state, []):
@@ -159,10 +213,11 @@ class WorkflowEngine:
                 f"Invalid transition from {current_state.value} to {new_state.value}"
             )
 
-        old_state = workflow.state
+        old_state = current.state
         new_updated_at = datetime.now().timestamp()
 
-        # Perform optimistic locking update - only succeeds if version hasn't changed
+        # Perform optimistic locking update - only succeeds if version hasn't changed.
+        # RETURNING hands back the updated row, so no refresh round-trip is needed.
         update_result = await self.db.execute(
             update(Workflow)
             .where(Workflow.id == workflow_id, Workflow.version == old_version)
@@ -171,10 +226,12 @@ class WorkflowEngine:
                 updated_at=new_updated_at,
                 version=old_version + 1,
             )
+            .returning(Workflow)
         )
+        workflow = update_result.scalar_one_or_none()
 
         # Check if update succeeded
-        if update_result.rowcount == 0:
+        if workflow is None:
             logger.warning(
                 "concurrent_modification_detected",
                 workflow_id=workflow_id,
@@ -186,9 +243,6 @@ class WorkflowEngine:
                 f"Expected version {old_version}, but it has changed. Please retry."
             )
 
-        # Refresh workflow object to get updated values
-        await self.db.refresh(workflow)
-
         # Record state change event
         await self._record_event(
             workflow.id,
@@ -210,20 +264,125 @@ class WorkflowEngine:
             version=workflow.version,
         )
 
-        # Publish event to event bus
+        return workflow, {
+            "workflow_id": workflow.id,
+            "from_state": old_state,
+            "to_state": new_state.value,
+            "reason": reason,
+        }
+
+    async def _publish_state_changed(self, state_changed: dict):
+        """Publish a payload returned by _transition() - only after it was committed"""
         if self.event_bus:
-            await self.event_bus.publish(
-                EventType.WORKFLOW_STATE_CHANGED,
-                {
-                    "workflow_id": workflow.id,
+            await self.event_bus.publish(EventType.WORKFLOW_STATE_CHANGED, state_changed)
+
+    async def transition_to_bulk(
+        self,
+        current: Dict[str, Tuple[int, str]],
+        new_state: WorkflowState,
+        reasons: Dict[str, str],
+    ) -> List[Workflow]:
+        """
+        Transition several workflows to the same state with one UPDATE.
+
+        Same rules as transition_to(): each transition is validated against
+        STATE_TRANSITIONS and guarded by the workflow's version, so rows that
+        changed concurrently are left alone. State-change events are recorded
+        with one executemany INSERT, and everything commits once.
+
+        Args:
+            current: workflow_id -> (version, state) as last read
+            new_state: Target state
+            reasons: workflow_id -> transition reason
+
+        Returns:
+            The workflows that were transitioned
+        """
+        old_states = {}
+        for workflow_id, (version, state) in current.items():
+            current_state = WorkflowState(state)
+            if new_state not in STATE_TRANSITIONS.get(current_state, []):
+                logger.error(
+                    "invalid_state_transition",
+                    workflow_id=workflow_id,
+                    attempted_transition=f"{current_state.value} -> {new_state.value}",
+                )
+                continue
+            old_states[workflow_id] = (version, state)
+
+        if not old_states:
+            return []
+
+        result = await self.db.execute(
+            update(Workflow)
+            .where(tuple_(Workflow.id, Workflow.version).in_(
+                [(workflow_id, version) for workflow_id, (version, _) in old_states.items()]
+            ))
+            .values(
+                state=new_state.value,
+                updated_at=datetime.now().timestamp(),
+                version=Workflow.version + 1,
+            )
+            .returning(Workflow)
+        )
+        updated = result.scalars().all()
+
+        if len(updated) < len(old_states):
+            logger.warning(
+                "concurrent_modification_detected",
+                workflow_ids=sorted(old_states.keys() - {w.id for w in updated}),
+                attempted_state=new_state.value,
+            )
+
+        if not updated:
+            await self.db.commit()
+            return []
+
+        occurred_at = datetime.now().timestamp()
+        transitions = []
+        event_rows = []
+        for workflow in updated:
+            old_state = old_states[workflow.id][1]
+            reason = reasons.get(workflow.id) or "State transition"
+            transitions.append((workflow, old_state, reason))
+            event_rows.append({
+                "workflow_id": workflow.id,
+                "event_type": EventType.WORKFLOW_STATE_CHANGED.value,
+                "event_data": json.dumps({
                     "from_state": old_state,
                     "to_state": new_state.value,
                     "reason": reason,
-                },
+                    "version": workflow.version,
+                }),
+                "occurred_at": occurred_at,
+            })
+
+        # Same statement as _record_event(), executed once for all rows - each
+        # INSERT numbers its own event, so there is no read-then-insert gap
+        await self.db.execute(_RECORD_EVENT_STMT, event_rows)
+
+        for workflow, old_state, reason in transitions:
+            logger.info(
+                "workflow_state_changed",
+                workflow_id=workflow.id,
+                from_state=old_state,
+                to_state=new_state.value,
+                reason=reason,
+                version=workflow.version,
             )
 
+        # CRITICAL: Commit BEFORE publishing events so handlers can read the workflows
         await self.db.commit()
-        return workflow
+
+        for workflow, old_state, reason in transitions:
+            await self._publish_state_changed({
+                "workflow_id": workflow.id,
+                "from_state": old_state,
+                "to_state": new_state.value,
+                "reason": reason,
+            })
+
+        return updated
 
     async def get_workflow(self, workflow_id: str) -> Workflow:
         """Get workflow by ID"""
@@ -248,7 +407,14 @@ class WorkflowEngine:
 
     async def list_workflows(self, state: WorkflowState = None, limit: int = 100) -> List[Workflow]:
         """List workflows, optionally filtered by state"""
-        query = select(Workflow).options(selectinload(Workflow.steps)).order_by(Workflow.created_at.desc()).limit(limit)
+        # Workflow.to_dict() only touches steps (for is_multi_step), so batch-load
+        # just their keys in one IN-query instead of full rows or a lazy load per workflow
+        query = (
+            select(Workflow)
+            .options(selectinload(Workflow.steps).load_only(WorkflowStep.id))
+            .order_by(Workflow.created_at.desc())
+            .limit(limit)
+        )
 
         if state:
             query = query.where(Workflow.state == state.value)
@@ -262,9 +428,8 @@ class WorkflowEngine:
 
         # Update context with result
         if result_data:
-            context = workflow.context_dict
-            context["result"] = result_data
-            workflow.update_context(context)
+            # New dict - context_dict is the shared parse cache and must not be mutated
+            workflow.update_context({**workflow.context_dict, "result": result_data})
 
         # Record completion event
         await self._record_event(
@@ -289,6 +454,7 @@ class WorkflowEngine:
         """
         Cancel all pending approvals for a workflow.
         Ensures data consistency - no pending approvals for terminal workflows.
+        Does not commit - the caller commits together with its own changes.
         """
         from app.models.orm import ApprovalRequest
         from app.models.schemas import ApprovalStatus
@@ -321,8 +487,6 @@ class WorkflowEngine:
                 {"approval_id": approval.id, "reason": reason}
             )
 
-        await self.db.commit()
-
         logger.info(
             "pending_approvals_cancelled",
             workflow_id=workflow_id,
@@ -342,12 +506,12 @@ class WorkflowEngine:
         - But WorkflowStep stays "running" (bug!)
         - On retry, no failed steps found → nothing resets
 
+        Does not commit - mark_failed() commits everything at once.
+
         Args:
             workflow_id: The workflow ID
             reason: Why the workflow failed (for logging)
         """
-        from app.models.orm import WorkflowStep
-
         result = await self.db.execute(
             select(WorkflowStep)
             .where(
@@ -386,8 +550,6 @@ class WorkflowEngine:
                 reason="workflow_failed_while_step_running"
             )
 
-        await self.db.commit()
-
         logger.info(
             "running_steps_marked_failed",
             workflow_id=workflow_id,
@@ -410,8 +572,10 @@ class WorkflowEngine:
         # Ensures invariant: FAILED workflow has no running steps
         await self._mark_running_steps_as_failed(workflow_id, error)
 
-        # transition_to already commits, so no need to commit again
-        workflow = await self.transition_to(workflow_id, WorkflowState.FAILED, f"Workflow failed: {error}")
+        # Cleanup, transition and failure event commit together (once, below)
+        workflow, state_changed = await self._transition(
+            workflow_id, WorkflowState.FAILED, f"Workflow failed: {error}"
+        )
 
         # Record failure event (transition_to already recorded state change)
         await self._record_event(
@@ -422,15 +586,17 @@ class WorkflowEngine:
 
         logger.error("workflow_failed", workflow_id=workflow_id, error=error)
 
-        # Publish event
+        # CRITICAL: Commit BEFORE publishing events so handlers can read the workflow
+        await self.db.commit()
+
+        # Publish events
+        await self._publish_state_changed(state_changed)
         if self.event_bus:
             await self.event_bus.publish(
                 EventType.WORKFLOW_FAILED,
                 {"workflow_id": workflow_id, "error": error},
             )
 
-        await self.db.commit()
-
         # Move to DLQ if requested
         if move_to_dlq:
             await self._move_workflow_to_dlq(workflow_id, error)
@@ -498,23 +664,16 @@ class WorkflowEngine:
         else:
             event_type_str = event_type
 
-        # Get next sequence number for this workflow
-        result = await self.db.execute(
-            select(func.max(WorkflowEvent.sequence_number))
-            .where(WorkflowEvent.workflow_id == workflow_id)
-        )
-        max_seq = result.scalar() or 0
-        next_seq = max_seq + 1
-
-        event = WorkflowEvent(
-            workflow_id=workflow_id,
-            event_type=event_type_str,
-            event_data=json.dumps(event_data),
-            occurred_at=datetime.now().timestamp(),
-            sequence_number=next_seq,
+        # Next sequence number is computed by the INSERT itself
+        await self.db.execute(
+            _RECORD_EVENT_STMT,
+            {
+                "workflow_id": workflow_id,
+                "event_type": event_type_str,
+                "event_data": json.dumps(event_data),
+                "occurred_at": datetime.now().timestamp(),
+            },
         )
-        self.db.add(event)
-        await self.db.flush()
 
     def can_transition(self, current_state: WorkflowState, new_state: WorkflowState) -> bool:
         """Check if transition is valid"""
@@ -531,8 +690,6 @@ class WorkflowEngine:
         In normal operation, mark_failed() converts running → failed, but this
         provides resilience against edge cases or race conditions.
         """
-        from app.models.orm import WorkflowStep
-
         result = await self.db.execute(
             select(WorkflowStep)
             .where(
@@ -589,8 +746,6 @@ class WorkflowEngine:
                     return await get_deployment_status(deployment_id)
                 return await create_deployment(deployment_id, input_data)
         """
-        from app.models.orm import WorkflowStep
-
         # Find first failed step
         first_failed_order = await self._find_first_failed_step(workflow_id)
 
@@ -655,9 +810,7 @@ class WorkflowEngine:
 
             reset_count += 1
 
-        # Commit all resets in a single transaction
-        await self.db.commit()
-
+        # Not committed here - retry_workflow() commits the resets with the retry itself
         logger.info(
             "reset_steps_completed",
             workflow_id=workflow_id,
@@ -695,7 +848,7 @@ class WorkflowEngine:
             raise ValueError(f"Workflow {workflow_id} not found")
 
         # Check if workflow is in TIMEOUT or FAILED state
-        if workflow.state not in [WorkflowState.TIMEOUT.value, WorkflowState.FAILED.value]:
+        if workflow.state not in _RETRYABLE_STATES:
             logger.warning(
                 "retry_workflow_invalid_state",
                 workflow_id=workflow_id,
@@ -750,8 +903,6 @@ class WorkflowEngine:
         workflow.last_retry_at = datetime.now().timestamp()
         workflow.updated_at = datetime.now().timestamp()
 
-        await self.db.commit()
-
         # Record retry event
         await self._record_event(
             workflow.id,
@@ -764,14 +915,15 @@ class WorkflowEngine:
             },
         )
 
-        # Transition back to RUNNING
-        await self.transition_to(
+        # Transition back to RUNNING (committed below with the rest of the retry)
+        _, state_changed = await self._transition(
             workflow_id,
             WorkflowState.RUNNING,
             f"Retry attempt {workflow.retry_count}/{workflow.max_retries}"
         )
 
-        # MULTI-STEP WORKFLOW: Reset failed steps and resume execution
+        # MULTI-STEP WORKFLOW: Reset failed steps (same transaction)
+        reset_count = 0
         if is_multi_step:
             logger.info(
                 "multi_step_retry_resetting_steps",
@@ -782,6 +934,13 @@ class WorkflowEngine:
             # Reset steps from failure point
             reset_count = await self._reset_steps_from_failure(workflow_id)
 
+        # One commit for the approval cleanup, retry count, transition and step resets.
+        # CRITICAL: before publishing, since handlers read the workflow in their own sessions
+        await self.db.commit()
+        await self._publish_state_changed(state_changed)
+
+        # MULTI-STEP WORKFLOW: Resume execution
+        if is_multi_step:
             if reset_count > 0:
                 # Resume execution from first pending step
                 logger.info(
@@ -809,6 +968,8 @@ class WorkflowEngine:
             )
 
             if self.event_bus:
+                # Carry the approval schema so the retry handler need not re-read the workflow
+                context = workflow.context_dict
                 await self.event_bus.publish(
                     EventType.APPROVAL_RETRY,
                     {
@@ -816,6 +977,8 @@ class WorkflowEngine:
                         "retry_count": workflow.retry_count,
                         "max_retries": workflow.max_retries,
                         "backoff_seconds": backoff_seconds,
+                        "approval_schema": context.get("_approval_schema"),
+                        "approval_timeout": context.get("_approval_timeout", 3600),
                     },
                 )
 
@@ -968,6 +1131,11 @@ class WorkflowEngine:
         if not workflow:
             return False
 
+        return self._is_rollback_allowed(workflow, target_state)
+
+    @staticmethod
+    def _is_rollback_allowed(workflow: Workflow, target_state: WorkflowState) -> bool:
+        """Check transition rules and rollback limit for an already-loaded workflow"""
         current_state = WorkflowState(workflow.state)
 
         # Check state transition allows it
@@ -1010,10 +1178,42 @@ class WorkflowEngine:
             for event in events
         ]
 
+    async def get_rollback_info(self, workflow_id: str, target_state: WorkflowState) -> dict:
+        """
+        Answer can_rollback and get_rollback_history in one call.
+
+        Loads the workflow once (without steps) and its rollback events with a
+        single query, then evaluates both in memory.
+
+        Args:
+            workflow_id: The workflow to check
+            target_state: The desired rollback state
+
+        Returns:
+            Dict with can_rollback, rollback_count, max_rollbacks and history
+
+        Raises:
+            ValueError: If the workflow does not exist
+        """
+        result = await self.db.execute(select(Workflow).where(Workflow.id == workflow_id))
+        workflow = result.scalar_one_or_none()
+
+        if not workflow:
+            raise ValueError(f"Workflow {workflow_id} not found")
+
+        history = await self.get_rollback_history(workflow_id)
+
+        return {
+            "workflow_id": workflow_id,
+            "target_state": target_state.value,
+            "can_rollback": self._is_rollback_allowed(workflow, target_state),
+            "rollback_count": workflow.rollback_count,
+            "max_rollbacks": workflow.max_rollbacks,
+            "history": history,
+        }
+
     async def execute_next_step(self, workflow_id: str):
         """Execute the next pending step in the workflow"""
-        from app.models.orm import WorkflowStep
-
         try:
             # Get next pending step
             result = await self.db.execute(
@@ -1077,8 +1277,6 @@ class WorkflowEngine:
 
     async def _execute_task_step(self, step):
         """Execute a task step"""
-        from app.models.orm import WorkflowStep
-
         try:
             # Get handler
             handler = TASK_HANDLERS.get(step.task_handler)
@@ -1141,7 +1339,6 @@ class WorkflowEngine:
 
     async def _execute_approval_step(self, step):
         """Execute an approval step by creating an approval request"""
-        from app.models.orm import WorkflowStep
         from app.core.approval_service import ApprovalService
 
         try:
@@ -1226,8 +1423,6 @@ class WorkflowEngine:
 
     async def handle_approval_response(self, approval_id: str, decision: str, response_data: dict = None):
         """Handle approval response and continue or rollback workflow"""
-        from app.models.orm import WorkflowStep
-
         # Get the step associated with this approval
         result = await self.db.execute(
             select(WorkflowStep).where(WorkflowStep.approval_id == approval_id)
@@ -1274,8 +1469,6 @@ class WorkflowEngine:
 
     async def _rollback_steps(self, workflow_id: str, failed_step_order: int):
         """Rollback all completed task steps before the failed approval"""
-        from app.models.orm import WorkflowStep
-
         logger.info(
             "rollback_initiated",
             workflow_id=workflow_id,
@@ -1320,8 +1513,6 @@ class WorkflowEngine:
 
     async def get_workflow_steps(self, workflow_id: str) -> List:
         """Get all steps for a workflow"""
-        from app.models.orm import WorkflowStep
-
         result = await self.db.execute(
             select(WorkflowStep)
             .where(WorkflowStep.workflow_id == workflow_id)
@@ -5,11 +5,13 @@ Database models using SQLAlchemy 2.0 async style.
 from sqlalchemy import Column, String, Integer, Float, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from functools import cached_property
 from typing import List, Dict
 import uuid
 import json
 
 from app.models.database import Base
+from app.models.serialization import json_loads
 
 
 class Workflow(Base):
@@ -91,10 +93,20 @@ class Workflow(Base):
 
     @property
     def context_dict(self):
-        """Get context as dictionary"""
-        if isinstance(self.context, str):
-            return json.loads(self.context)
-        return self.context
+        """
+        Get context as dictionary (parsed once per stored value - re-parsed after update_context).
+
+        The dict is shared by every read of the same stored value: treat it as
+        read-only and pass a new dict to update_context() instead of mutating it.
+        """
+        if not isinstance(self.context, str):
+            return self.context
+        # Unlike ui_schema, context changes, so the cache is keyed on the raw string
+        cached = self.__dict__.get("_context_cache")
+        if cached is None or cached[0] is not self.context:
+            cached = (self.context, json_loads(self.context))
+            self.__dict__["_context_cache"] = cached
+        return cached[1]
 
     def update_context(self, context_dict: dict):
         """Update context from dictionary"""
@@ -234,9 +246,9 @@ class ApprovalRequest(Base):
             "id": self.id,
             "workflow_id": self.workflow_id,
             "status": self.status,
-            "ui_schema": json.loads(self.ui_schema) if isinstance(self.ui_schema, str) else self.ui_schema,
+            "ui_schema": self.ui_schema_dict,
             "response_data": (
-                json.loads(self.response_data)
+                json_loads(self.response_data)
                 if self.response_data and isinstance(self.response_data, str)
                 else self.response_data
             ),
@@ -247,18 +259,18 @@ class ApprovalRequest(Base):
             "slack_message_ts": self.slack_message_ts,
         }
 
-    @property
+    @cached_property
     def ui_schema_dict(self):
-        """Get UI schema as dictionary"""
+        """Get UI schema as dictionary (parsed once per instance - the schema never changes)"""
         if isinstance(self.ui_schema, str):
-            return json.loads(self.ui_schema)
+            return json_loads(self.ui_schema)
         return self.ui_schema
 
     @property
     def response_data_dict(self):
         """Get response data as dictionary"""
         if self.response_data and isinstance(self.response_data, str):
-            return json.loads(self.response_data)
+            return json_loads(self.response_data)
         return self.response_data
 
     def is_expired(self) -> bool:
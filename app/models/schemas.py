@@ -3,7 +3,7 @@ Pydantic schemas for API requests and responses.
 Includes enums for state management and approval UI schemas.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional, Literal, Any, List, Dict
 from enum import Enum
 from datetime import datetime
@@ -136,6 +136,10 @@ class ApprovalUISchema(BaseModel):
     fields: List[FormField] = Field(default_factory=list, description="Form fields")
     buttons: List[ApprovalButton] = Field(default_factory=list, description="Action buttons")
 
+    # Memoized by SlackAdapter.has_text_input_fields / render_approval_result (not serialized)
+    _has_text_inputs: Optional[bool] = PrivateAttr(default=None)
+    _result_context_text: Optional[str] = PrivateAttr(default=None)
+
     class Config:
         json_schema_extra = {
             "example": {
@@ -0,0 +1,28 @@
+"""
+JSON encoding helpers for payloads stored in the database or received from webhooks.
+Uses orjson when installed and falls back to the stdlib json module otherwise.
+"""
+
+from typing import Any, Union
+
+try:
+    import orjson
+
+    def json_loads(data: Union[str, bytes]) -> Any:
+        """Deserialize JSON from str or bytes"""
+        return orjson.loads(data)
+
+    def json_dumps(obj: Any) -> str:
+        """Serialize to a JSON string (orjson emits bytes, so decode for Text columns)"""
+        return orjson.dumps(obj).decode("utf-8")
+
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def json_loads(data: Union[str, bytes]) -> Any:
+        """Deserialize JSON from str or bytes"""
+        return json.loads(data)
+
+    def json_dumps(obj: Any) -> str:
+        """Serialize to a JSON string"""
+        return json.dumps(obj)
@@ -2,23 +2,42 @@
 Main FastAPI application - Human-in-the-Loop Orchestrator.
 """
 
+import atexit
+import logging
 import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
 import structlog
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.api.v1 import router as api_v1_router
 from app.core.startup import lifespan
 
-# Configure structured logging
+# Configure structured logging.
+# Rendered lines are handed to a queue and written to stdout by a listener
+# thread, so a log call on the event loop never blocks on I/O.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_log_sink = logging.getLogger("app.log_sink")
+_log_sink.addHandler(QueueHandler(_log_queue))
+_log_sink.setLevel(logging.DEBUG)  # Level filtering is left to structlog, as with PrintLogger
+_log_sink.propagate = False
+
 structlog.configure(
     processors=[
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.add_log_level,
         structlog.processors.JSONRenderer(),
     ],
-    logger_factory=structlog.PrintLoggerFactory(),
+    logger_factory=lambda *args: _log_sink,
 )
 
 logger = structlog.get_logger()
@@ -46,6 +65,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON bodies (DLQ, approval and conversation listings repeat
+# the same field names on every row); small responses are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # ============================================================================
 # Mount API Routes
 # ============================================================================
@@ -10,7 +10,10 @@ echo "Starting FastAPI application..."
 # Start Uvicorn server
 # Azure expects the app to bind to 0.0.0.0 and use the PORT environment variable
 echo "Starting Uvicorn server on port ${PORT:-8000}..."
+# uvloop (installed with uvicorn[standard]) - fail fast if it is missing
+# rather than silently falling back to the slower default asyncio loop
 python -m uvicorn main:app \
+    --loop uvloop \
     --host 0.0.0.0 \
     --port ${PORT:-8000} \
     --workers 1 \
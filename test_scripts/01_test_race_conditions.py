@@ -7,6 +7,7 @@ Tests Critical Fixes:
 1. Optimistic locking prevents concurrent workflow state modifications
 2. Row-level locking prevents concurrent approval responses
 3. Check order fix (expiry before status) prevents race conditions
+4. Idempotency-Key claims prevent duplicate workflows from concurrent or retried submissions
 """
 
 import asyncio
@@ -16,12 +17,16 @@ from datetime import datetime, timedelta
 from fixtures import (
     print_test_header, print_pass, print_fail, print_summary, print_info,
     TestContext, create_test_workflow, create_test_approval,
-    assert_equal, assert_true
+    assert_equal, assert_true, assert_in
 )
 
+from sqlalchemy import select, func
+
+from app.api.v1.routes.workflows import create_workflow as create_workflow_route
 from app.core.workflow_engine import WorkflowEngine, ConcurrentModificationError, InvalidStateTransitionError
 from app.core.approval_service import ApprovalService
-from app.models.schemas import WorkflowState
+from app.models.orm import Workflow, IdempotencyKey
+from app.models.schemas import WorkflowState, WorkflowCreate
 
 
 # ============================================================================
@@ -448,6 +453,89 @@ async def test_retry_after_concurrent_modification():
                 )
 
 
+# ============================================================================
+# Test: Concurrent Duplicate Submissions (Idempotency-Key)
+# ============================================================================
+
+async def test_concurrent_duplicate_submissions():
+    """
+    Test that concurrent submissions with the same Idempotency-Key create one workflow.
+
+    Scenario:
+    - Five requests with the same key hit the create endpoint simultaneously
+    - Exactly one creates a workflow, the others get the in-progress 409 (or its replay)
+    - A later retry with the key replays the stored response
+    """
+    async with TestContext() as ctx:
+        workflow_req = WorkflowCreate(workflow_type="test", context={"test": "data"})
+
+        async def submit():
+            async with ctx.get_session() as s:
+                e = WorkflowEngine(s, ctx.event_bus)
+                return await create_workflow_route(workflow_req, "dup-key", s, e)
+
+        responses = await asyncio.gather(*(submit() for _ in range(5)))
+
+        created = [r for r in responses if not hasattr(r, "status_code")]
+        duplicates = [r for r in responses if hasattr(r, "status_code")]
+        assert_equal(len(created), 1, "Exactly one submission should create the workflow")
+        for response in duplicates:
+            # 409 while the key is claimed, or a replay once the response is stored
+            if response.status_code == 200:
+                assert_in(created[0].id, response.body.decode())
+            else:
+                assert_equal(response.status_code, 409, "Duplicates should get 409 while the key is claimed")
+
+        async with ctx.get_session() as s:
+            count = await s.scalar(select(func.count()).select_from(Workflow))
+            assert_equal(count, 1, "Only one workflow should exist")
+
+            replay = await create_workflow_route(workflow_req, "dup-key", s, WorkflowEngine(s, ctx.event_bus))
+            assert_equal(replay.status_code, 200, "Retry should replay the stored response")
+            assert_in(created[0].id, replay.body.decode(), "Replay should return the created workflow")
+
+
+async def test_idempotency_key_kept_after_post_commit_failure():
+    """
+    Test that a failure after the workflow is committed does not release the key.
+
+    Scenario:
+    - Workflow is committed, then starting its steps raises
+    - The claim stays bound to the workflow
+    - A retry with the same key returns that workflow instead of creating another
+    """
+
+    class FailingStartEngine(WorkflowEngine):
+        async def transition_to(self, workflow_id, new_state, reason=None):
+            raise RuntimeError("Simulated failure after commit")
+
+    async with TestContext() as ctx:
+        workflow_req = WorkflowCreate(
+            workflow_type="test",
+            context={"test": "data"},
+            steps=[{"type": "task", "handler": "noop"}],
+        )
+
+        async with ctx.get_session() as s:
+            try:
+                await create_workflow_route(workflow_req, "retry-key", s, FailingStartEngine(s, ctx.event_bus))
+                raise AssertionError("Expected the simulated failure to propagate")
+            except RuntimeError:
+                pass
+
+        async with ctx.get_session() as s:
+            claim = await s.get(IdempotencyKey, "retry-key")
+            assert_true(claim is not None, "Claim should be kept once the workflow is committed")
+            assert_true(claim.workflow_id is not None, "Claim should be bound to the workflow")
+
+            replay = await create_workflow_route(workflow_req, "retry-key", s, WorkflowEngine(s, ctx.event_bus))
+            assert_equal(replay.status_code, 200, "Retry should replay the committed workflow")
+            assert_in(claim.workflow_id, replay.body.decode())
+
+            count = await s.scalar(select(func.count()).select_from(Workflow))
+            assert_equal(count, 1, "Retry must not create a duplicate workflow")
+
+
 # ============================================================================
 # Main Test Runner
 # ============================================================================
@@ -472,6 +560,10 @@ async def main():
          test_approval_timeout_race),
         ("Retry after concurrent modification",
          test_retry_after_concurrent_modification),
+        ("Concurrent duplicate submissions (Idempotency-Key)",
+         test_concurrent_duplicate_submissions),
+        ("Idempotency-Key kept after post-commit failure",
+         test_idempotency_key_kept_after_post_commit_failure),
     ]
 
     for test_name, test_func in tests:
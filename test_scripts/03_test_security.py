@@ -26,7 +26,8 @@ from app.config.security import (
     generate_callback_token,
     verify_callback_token,
     verify_slack_signature,
-    SECRET_KEY
+    SECRET_KEY,
+    _verified_tokens,
 )
 
 
@@ -175,6 +176,23 @@ async def test_token_tampering_detection():
         "Changed signature should be detected"
     )
 
+    # Alternate spellings of the correct signature are not accepted
+    signature = parts[2]
+    spaced = " ".join(signature[i:i + 2] for i in range(0, len(signature), 2))
+    for variant in (signature.upper(), spaced, signature + "00"):
+        if variant == signature:
+            continue  # All-digit signature - uppercase changes nothing
+        assert_equal(
+            verify_callback_token(f"{parts[0]}:{parts[1]}:{variant}"),
+            None,
+            f"Signature variant {variant!r} should be rejected"
+        )
+
+    # Rejected tokens are not cached (they would evict valid ones)
+    assert_false(tampered1 in _verified_tokens, "Rejected token should not be cached")
+    assert_equal(verify_callback_token(token), approval_id)
+    assert_true(token in _verified_tokens, "Verified token should be cached")
+
 
 # ============================================================================
 # Test: Constant-Time Comparison
@@ -249,6 +267,13 @@ async def test_slack_signature_valid():
         result = verify_slack_signature(timestamp, body, signature)
         assert_true(result, "Valid signature should be accepted")
 
+        # Only the exact lowercase hex form is accepted
+        upper_signature = "v0=" + signature[3:].upper()
+        assert_false(
+            verify_slack_signature(timestamp, body, upper_signature),
+            "Uppercase signature should be rejected"
+        )
+
     finally:
         # Restore original env var
         os.environ["SLACK_SIGNING_SECRET"] = original_secret
@@ -8,6 +8,7 @@ Tests:
 - Multiple subscribers
 - Event handler failures don't block others
 - Event bus lifecycle
+- Handlers publishing follow-up events under back-pressure
 """
 
 import asyncio
@@ -166,6 +167,43 @@ async def test_event_queue_stats():
     assert_true(len(stats["event_types"]) > 0, "Should have event types registered")
 
 
+async def test_republishing_handlers_drain_full_queue():
+    """Handlers that publish follow-up events must not deadlock a full bus"""
+    bus = EventBus(max_queue_size=4)
+    collector = EventCollector()
+
+    async def republish(data: dict):
+        # Like workflow_started -> request_approval -> APPROVAL_REQUESTED
+        await bus.publish(EventType.WORKFLOW_COMPLETED, data)
+
+    bus.subscribe(EventType.WORKFLOW_STARTED, republish)
+    bus.subscribe(EventType.WORKFLOW_COMPLETED, collector.handler)
+
+    await bus.start()
+
+    try:
+        # Several times the queue size, so publishers hit back-pressure
+        # while handlers publish from inside the processor
+        await asyncio.wait_for(
+            asyncio.gather(*(
+                bus.publish(EventType.WORKFLOW_STARTED, {"id": i})
+                for i in range(20)
+            )),
+            timeout=5,
+        )
+
+        for _ in range(50):
+            if collector.count() == 20:
+                break
+            await asyncio.sleep(0.1)
+
+        assert_equal(collector.count(), 20, "Every re-published event should be handled")
+        assert_equal(bus.get_stats()["queue_size"], 0, "Queue should be drained")
+
+    finally:
+        await asyncio.wait_for(bus.stop(), timeout=5)
+
+
 async def main():
     """Run all event bus tests"""
     print_test_header("Event Bus Tests")
@@ -180,6 +218,7 @@ async def main():
         ("Event bus lifecycle", test_event_bus_lifecycle),
         ("Multiple event types", test_multiple_event_types),
         ("Event queue statistics", test_event_queue_stats),
+        ("Re-publishing handlers drain a full queue", test_republishing_handlers_drain_full_queue),
     ]
 
     for test_name, test_func in tests: